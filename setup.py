@@ -51,10 +51,11 @@ def setup_environment():
         return False
     
     try:
-        import pytz
-        print(f"   ✅ pytz available")
-    except ImportError:
-        print("   ❌ pytz not installed")
+        from zoneinfo import ZoneInfo
+        ZoneInfo('America/Los_Angeles')
+        print(f"   ✅ Time zone data available")
+    except Exception:
+        print("   ❌ Time zone data not available (zoneinfo/tzdata)")
         print("   💡 Run: pip install -r config/requirements.txt")
         return False
     
@@ -1,57 +1,223 @@
 import discord
+from discord import app_commands
 from discord.ext import commands
 import asyncio
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from aiohttp import web
-import pytz
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from functools import lru_cache
+from collections import OrderedDict
+from types import MappingProxyType
 import sqlite3
 import signal
 import traceback
 import logging
-from decouple import config
+from decouple import config, RepositoryEnv
 import os
 import re
 from typing import Optional
 import random
+import json
+import hmac
+import time
+import io
+import csv
+import gzip
+import socket
+import heapq
+import itertools
+import contextlib
+import queue
+import atexit
+from logging.handlers import QueueHandler, QueueListener
+
+# Set up logging. Handlers on the event loop only enqueue records; a listener thread
+# formats and writes them, so a burst of log lines never blocks on stdout.
+LOG_FORMAT = config('LOG_FORMAT', default='json')  # json | text
+LOG_QUEUE_SIZE = int(config('LOG_QUEUE_SIZE', default='10000'))
+LOG_RATE_LIMIT = int(config('LOG_RATE_LIMIT', default='5'))  # repeats of one INFO line per user per window, 0 = off
+LOG_RATE_WINDOW = 60  # seconds
+LOG_FIELDS = ('guild_id', 'user_id', 'event')
+
+log_stats = {"dropped": 0, "suppressed": 0}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with guild/user/event fields when the call passed them via extra=."""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in LOG_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Let each (message template, user) through LOG_RATE_LIMIT times per window.
+
+    Only INFO and below are limited; warnings and errors always pass. Counts
+    reset every window, so memory is bounded by the distinct lines in one window.
+    """
+
+    def __init__(self, limit: int, window: float):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.window_start = time.monotonic()
+        self.counts = {}
+
+    def filter(self, record):
+        if self.limit <= 0 or record.levelno > logging.INFO:
+            return True
+        now = time.monotonic()
+        if now - self.window_start >= self.window:
+            self.window_start = now
+            self.counts.clear()
+        key = (record.msg, getattr(record, 'user_id', None))
+        seen = self.counts.get(key, 0) + 1
+        self.counts[key] = seen
+        if seen > self.limit:
+            log_stats["suppressed"] += 1
+            return False
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that counts and drops records when the queue is full instead of blocking."""
+
+    def prepare(self, record):
+        # Formatting is left to the listener thread; log args must not be mutated after the call
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_stats["dropped"] += 1
+
+
+def setup_logging() -> QueueListener:
+    """Route the root logger through a bounded queue to a stdout listener thread."""
+    stream = logging.StreamHandler()
+    if LOG_FORMAT == 'text':
+        stream.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    else:
+        stream.setFormatter(JsonFormatter())
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(RateLimitFilter(LOG_RATE_LIMIT, LOG_RATE_WINDOW))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(logging.INFO)
+
+    listener = QueueListener(log_queue, stream)
+    listener.start()
+    atexit.register(listener.stop)  # drain what is queued on exit
+    return listener
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def log_ctx(member, event: str) -> dict:
+    """extra= fields for a log line about one member."""
+    guild = getattr(member, 'guild', None)
+    return {"user_id": member.id, "guild_id": guild.id if guild else None, "event": event}
+
+
+_log_listener = setup_logging()
 logger = logging.getLogger(__name__)
 
+# Every command is a hybrid (prefix + slash) command. With PREFIX_COMMANDS=false the bot is
+# slash-only and drops the message and typing intents, so the gateway stops sending it
+# every guild message.
+PREFIX_COMMANDS = config('PREFIX_COMMANDS', default=True, cast=bool)
+
 intents = discord.Intents.default()
 intents.voice_states = True
-intents.message_content = True  # Required for prefix commands in discord.py 2.x
+if PREFIX_COMMANDS:
+    intents.message_content = True  # Required for prefix commands in discord.py 2.x
+else:
+    intents.messages = False
+    intents.typing = False
 
 # Database setup — DB_DIR env var for Docker volume mount, falls back to script directory
 DB_DIR = config('DB_DIR', default=os.path.dirname(os.path.abspath(__file__)))
 os.makedirs(DB_DIR, exist_ok=True)
 DB_PATH = os.path.join(DB_DIR, "curfew_bot.db")
 
-PACIFIC_TZ = pytz.timezone('US/Pacific')
+
+
+@lru_cache(maxsize=None)
+def get_zone(name: str) -> ZoneInfo:
+    """Return a cached ZoneInfo. Raises ZoneInfoNotFoundError or ValueError for unknown names."""
+    return ZoneInfo(name)
+
+
+# Times are stored and compared as UTC instants; zones are only applied at input and display
+DEFAULT_TIMEZONE = config('DEFAULT_TIMEZONE', default='America/Los_Angeles')
+DEFAULT_TZ = get_zone(DEFAULT_TIMEZONE)
+
+# Per-user and per-guild timezone overrides, loaded from the DB at startup
+user_timezones = {}   # {user_id: ZoneInfo}
+guild_timezones = {}  # {guild_id: ZoneInfo}
+
+# The curfew role the bot created or adopted in role mode, by guild. Only this role is
+# ever removed from members, so a server's own role that happens to share the name is left alone.
+managed_roles = {}  # {guild_id: role_id}
+
+# Members the bot gave the curfew role, mirrored from the role_holds table. Lifting works
+# from this by user ID: without the members intent a role holder who isn't in voice is
+# neither in role.members nor returned by guild.get_member().
+role_holds = {}  # {user_id: {"guild_id": int, "role_id": int, "release_at": datetime}}
 
 # Scheduled tasks keyed by member ID (int).
 # Each value is a dict: {"kick": Task, "reminder": Task | None}
 scheduled_tasks = {}
 
+# When each scheduled kick is due, keyed like scheduled_tasks: {user_id: unix timestamp}
+scheduled_due = {}
+
 # Tracks last shame message time per user to prevent spam
 last_shame_time = {}
 
 # Appeal state keyed by user_id — resets on bot restart (generous default)
 appeal_state = {}  # {user_id: {"count": int, "last_attempt": datetime | None}}
 
-APPEAL_WINDOW_MINUTES = 15
-APPEAL_COOLDOWN_SECONDS = 60
-APPEAL_MAX_PER_CURFEW = 2
-APPEAL_GRANT_RATE = 0.60
-APPEAL_EXTENSIONS = [15, 10]  # minutes: 1st appeal grants 15 min, 2nd grants 10 min
-
-TOKEN = config('BOT_TOKEN')
+TOKEN = config('BOT_TOKEN', default='')  # checked at startup so tools (src/replay.py) can import this module
 GUILD_ID = int(config('GUILD_ID', default='848474364562243615'))
 HEALTH_PORT = int(config('HEALTH_PORT', default='8080'))
 HEALTH_HOST = config('HEALTH_HOST', default='127.0.0.1')
 ANTHROPIC_API_KEY = config('ANTHROPIC_API_KEY', default='')
-AI_DAILY_LIMIT = int(config('AI_DAILY_LIMIT', default='50'))
-AI_MODEL = config('AI_MODEL', default='claude-haiku-4-5-latest')
+# Cache of AI appeal rulings per (outcome, normalized reason)
+AI_CACHE_SIZE = int(config('AI_CACHE_SIZE', default='256'))        # reasons kept, least recently used dropped first
+AI_CACHE_TTL = float(config('AI_CACHE_TTL', default='3600'))       # seconds before a reason's rulings are refreshed
+AI_CACHE_VARIANTS = int(config('AI_CACHE_VARIANTS', default='3'))  # different rulings collected per reason, then rotated
+# Enforcement event log — buffered in memory, flushed to SQLite in batches
+EVENT_FLUSH_INTERVAL = int(config('EVENT_FLUSH_INTERVAL', default='5'))  # seconds
+EVENT_RETENTION_DAYS = int(config('EVENT_RETENTION_DAYS', default='30'))
+EVENT_BUFFER_MAX = 10000  # events held while the DB is unreachable; newer ones beyond this are dropped
+# Active/standby HA — instances sharing DB_DIR elect a leader via a lease row
+HA_ENABLED = config('HA_ENABLED', default=False, cast=bool)
+HA_LEASE_SECONDS = float(config('HA_LEASE_SECONDS', default='15'))
+# With HA off the ID only marks the lease as taken; keep it stable across restarts so a
+# crashed instance isn't locked out by its own unexpired lease
+HA_INSTANCE_ID = config(
+    'HA_INSTANCE_ID',
+    default=f"{socket.gethostname()}-{os.getpid()}" if HA_ENABLED else socket.gethostname(),
+)
+# Opt-in gateway recorder for src/replay.py (disabled if unset)
+RECORD_PATH = config('RECORD_PATH', default='')
+# Bearer token for the admin HTTP API (API is disabled if unset)
+ADMIN_API_TOKEN = config('ADMIN_API_TOKEN', default='')
 
 # AI shame message client (optional — falls back to static messages if not configured)
 ai_client = None
@@ -69,14 +235,221 @@ if ANTHROPIC_API_KEY:
 ai_call_count = 0
 ai_call_date = None
 
-# Users exempt from curfews (by Discord user ID, comma-separated in .env)
-EXCLUDED_USERS = {int(uid) for uid in config('EXCLUDED_USERS', default='').split(',') if uid.strip()}
+# ---------------------------------------------------------------------------
+# Reloadable settings
+# ---------------------------------------------------------------------------
+# Read from the environment/.env like the rest, but reloadable on SIGHUP or
+# POST /api/config/reload, and overridable globally or per guild (guild_config
+# table, where guild_id 0 holds the global overrides).
+# A reload validates everything into a new Settings and swaps it in with one
+# assignment, so a handler never sees a mix of old and new values.
+
+def _int_at_least(minimum: int):
+    def parse(value) -> int:
+        number = int(value)
+        if number < minimum:
+            raise ValueError(f"must be at least {minimum}")
+        return number
+    return parse
+
+
+def _float_between(low: float, high: float):
+    def parse(value) -> float:
+        number = float(value)
+        if not low <= number <= high:
+            raise ValueError(f"must be between {low:g} and {high:g}")
+        return number
+    return parse
+
+
+def _minutes_list(value) -> tuple:
+    minutes = tuple(int(m) for m in str(value).split(',') if m.strip())
+    if not minutes or min(minutes) <= 0:
+        raise ValueError("must be comma-separated positive minutes")
+    return minutes
+
+
+def _user_ids(value) -> frozenset:
+    return frozenset(int(uid) for uid in str(value).split(',') if uid.strip())
+
+
+def _non_empty(value) -> str:
+    text = str(value).strip()
+    if not text:
+        raise ValueError("must not be empty")
+    return text
+
+
+def _one_of(*choices):
+    def parse(value) -> str:
+        text = str(value).strip().lower()
+        if text not in choices:
+            raise ValueError(f"must be one of {', '.join(choices)}")
+        return text
+    return parse
+
+
+GLOBAL_CONFIG_ID = 0  # guild_config rows that apply to every guild; any setting may be set here
+
+# {name: (parser, default, overridable per guild)}
+SETTINGS_SCHEMA = {
+    'EXCLUDED_USERS': (_user_ids, '', True),  # users exempt from curfews, comma-separated IDs
+    'AI_DAILY_LIMIT': (_int_at_least(0), '50', False),
+    'AI_MODEL': (_non_empty, 'claude-haiku-4-5-latest', False),
+    'AI_EDIT_DEADLINE': (_float_between(0, 60), '10', False),  # seconds the static text may be upgraded for
+    'APPEAL_WINDOW_MINUTES': (_int_at_least(1), '15', True),
+    'APPEAL_COOLDOWN_SECONDS': (_int_at_least(0), '60', True),
+    'APPEAL_MAX_PER_CURFEW': (_int_at_least(0), '2', True),
+    'APPEAL_GRANT_RATE': (_float_between(0, 1), '0.60', True),
+    'APPEAL_EXTENSIONS': (_minutes_list, '15,10', True),  # 1st appeal grants 15 min, 2nd grants 10 min
+    'SHAME_CHANNEL': (_non_empty, 'general', True),
+    'REMINDER_CHANNEL': (_non_empty, 'curfew', True),
+    'ENFORCEMENT_MODE': (_one_of('kick', 'role'), 'kick', True),  # role = also deny Connect via CURFEW_ROLE
+    'CURFEW_ROLE': (_non_empty, 'Curfewed', True),
+}
+
+
+def _parse_settings(raw: dict, errors: list, prefix: str = '') -> dict:
+    values = {}
+    for name, value in raw.items():
+        try:
+            values[name] = SETTINGS_SCHEMA[name][0](value)
+        except (ValueError, TypeError) as e:
+            errors.append(f"{prefix}{name}: {e}")
+    return values
+
+
+def _check_settings(values: dict, errors: list, prefix: str = ''):
+    if len(values['APPEAL_EXTENSIONS']) < values['APPEAL_MAX_PER_CURFEW']:
+        errors.append(f"{prefix}APPEAL_EXTENSIONS needs an entry for each of the APPEAL_MAX_PER_CURFEW appeals")
+
+
+class Settings:
+    """Validated global settings plus per-guild overrides. Never mutated after construction.
+
+    raw and guild_raw are the unparsed strings ({guild_id: {name: value}} for the latter).
+    guild_raw[GLOBAL_CONFIG_ID] overrides raw for every guild.
+    Raises ValueError listing every invalid value.
+    """
+
+    def __init__(self, raw: dict, guild_raw: dict):
+        errors = []
+        global_raw = guild_raw.get(GLOBAL_CONFIG_ID, {})
+        for name in global_raw:
+            if name not in SETTINGS_SCHEMA:
+                errors.append(f"global: unknown setting {name}")
+        known = {name: value for name, value in global_raw.items() if name in SETTINGS_SCHEMA}
+        base = _parse_settings({**raw, **known}, errors)
+        if not errors:
+            _check_settings(base, errors)
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+        overrides = {}
+        for guild_id, values in guild_raw.items():
+            if guild_id == GLOBAL_CONFIG_ID:
+                continue
+            prefix = f"guild {guild_id}: "
+            for name in values:
+                if name not in SETTINGS_SCHEMA or not SETTINGS_SCHEMA[name][2]:
+                    errors.append(f"{prefix}{name} cannot be overridden per guild")
+            known = {name: value for name, value in values.items() if SETTINGS_SCHEMA.get(name, (None, None, False))[2]}
+            overrides[guild_id] = _parse_settings(known, errors, prefix)
+            if not errors:
+                _check_settings({**base, **overrides[guild_id]}, errors, prefix)
+
+        if errors:
+            raise ValueError("; ".join(errors))
+
+        self.raw = dict(raw)
+        self.guild_raw = {guild_id: dict(values) for guild_id, values in guild_raw.items() if values}
+        self.base = MappingProxyType(base)
+        self.overrides = {guild_id: MappingProxyType(values) for guild_id, values in overrides.items() if values}
+        self.guilds = {guild_id: MappingProxyType({**base, **values}) for guild_id, values in self.overrides.items()}
+
+    def for_guild(self, guild_id: Optional[int]):
+        return self.guilds.get(guild_id, self.base)
+
+
+def find_env_file() -> str:
+    """The .env file decouple would use: the nearest one in this directory or a parent."""
+    path = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        candidate = os.path.join(path, '.env')
+        if os.path.isfile(candidate):
+            return candidate
+        parent = os.path.dirname(path)
+        if parent == path:
+            return ''
+        path = parent
+
+
+def read_settings_env() -> dict:
+    """Raw setting values, with the .env file re-read on every call.
+
+    Same precedence as config(): the process environment, then .env, then the
+    default. A value set in the environment therefore cannot change on reload;
+    use the global overrides (PUT /api/config/global) for that.
+    """
+    path = find_env_file()
+    file_values = RepositoryEnv(path).data if path else {}
+    return {
+        name: os.environ.get(name, file_values.get(name, default))
+        for name, (_, default, _) in SETTINGS_SCHEMA.items()
+    }
+
+
+def settings_to_dict(values) -> dict:
+    """JSON-friendly copy of a settings mapping."""
+    return {
+        name: sorted(value) if isinstance(value, frozenset) else list(value) if isinstance(value, tuple) else value
+        for name, value in values.items()
+    }
+
+
+settings = Settings(read_settings_env(), {})
+
+
+def get_settings(guild_id: Optional[int] = None):
+    """Current settings for a guild: the global values with that guild's overrides applied.
+
+    Read it once per operation so the whole operation sees one consistent version.
+    """
+    return settings.for_guild(guild_id)
+
+
+def swap_settings(new: Settings) -> list:
+    """Make `new` the current settings. Returns what changed."""
+    global settings
+    changed = [name for name in SETTINGS_SCHEMA if new.base[name] != settings.base[name]]
+    changed += [
+        f"guild {guild_id}" for guild_id in sorted(set(new.overrides) | set(settings.overrides))
+        if new.overrides.get(guild_id) != settings.overrides.get(guild_id)
+    ]
+    settings = new
+    logger.info("Settings reloaded, changed: %s", ", ".join(changed) or "nothing", extra={"event": "config_reload"})
+    return changed
+
+
+def reload_settings() -> list:
+    """Re-read settings and guild overrides, validate them and swap them in.
+
+    Raises ValueError and keeps the current settings if anything is invalid.
+    """
+    guild_raw = get_guild_config()
+    if guild_raw is None:
+        raise ValueError("could not read guild overrides from the database")
+    return swap_settings(Settings(read_settings_env(), guild_raw))
+
+bot = commands.Bot(
+    command_prefix='!' if PREFIX_COMMANDS else commands.when_mentioned,
+    intents=intents,
+)
 
 # Guard to prevent duplicate health server starts on reconnect
 _health_server_started = False
 _health_runner = None
+_event_flush_task = None
+_lease_task = None
+_app_commands_synced = False
 
 # ---------------------------------------------------------------------------
 # Database helpers — all use context managers to prevent connection leaks
@@ -84,7 +457,7 @@ _health_runner = None
 
 def get_connection():
     """Get a SQLite connection."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, timeout=10)
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -93,6 +466,8 @@ def init_database():
     """Initialize the SQLite database with required tables."""
     try:
         with get_connection() as conn:
+            # WAL lets a standby instance read while the leader writes (see HA lease below)
+            conn.execute('PRAGMA journal_mode=WAL')
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS curfews (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -103,9 +478,286 @@ def init_database():
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
+            # Keyset pagination for list_curfews walks this index
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_curfews_time
+                ON curfews (curfew_time, user_id)
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    guild_id INTEGER NOT NULL,
+                    event_type TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    latency_ms REAL
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_events_created_at
+                ON events (created_at)
+            ''')
+            # Rollups maintained incrementally as events are flushed — stats reads never scan events
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS user_stats (
+                    user_id INTEGER NOT NULL,
+                    guild_id INTEGER NOT NULL,
+                    kicks INTEGER NOT NULL DEFAULT 0,
+                    shames INTEGER NOT NULL DEFAULT 0,
+                    appeals INTEGER NOT NULL DEFAULT 0,
+                    appeals_granted INTEGER NOT NULL DEFAULT 0,
+                    appeal_lead_minutes REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (user_id, guild_id)
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_user_stats_kicks
+                ON user_stats (guild_id, kicks)
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS daily_stats (
+                    day TEXT NOT NULL,
+                    guild_id INTEGER NOT NULL,
+                    kicks INTEGER NOT NULL DEFAULT 0,
+                    shames INTEGER NOT NULL DEFAULT 0,
+                    appeals INTEGER NOT NULL DEFAULT 0,
+                    appeals_granted INTEGER NOT NULL DEFAULT 0,
+                    appeal_lead_minutes REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, guild_id)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS guild_stats (
+                    guild_id INTEGER PRIMARY KEY,
+                    kicks INTEGER NOT NULL DEFAULT 0,
+                    shames INTEGER NOT NULL DEFAULT 0,
+                    appeals INTEGER NOT NULL DEFAULT 0,
+                    appeals_granted INTEGER NOT NULL DEFAULT 0,
+                    appeal_lead_minutes REAL NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS leader_lease (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    holder TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    acquired_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS user_settings (
+                    user_id INTEGER PRIMARY KEY,
+                    timezone TEXT
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS guild_settings (
+                    guild_id INTEGER PRIMARY KEY,
+                    timezone TEXT
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS guild_config (
+                    guild_id INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    PRIMARY KEY (guild_id, name)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS managed_roles (
+                    guild_id INTEGER PRIMARY KEY,
+                    role_id INTEGER NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS role_holds (
+                    user_id INTEGER PRIMARY KEY,
+                    guild_id INTEGER NOT NULL,
+                    role_id INTEGER NOT NULL,
+                    release_at TEXT NOT NULL
+                )
+            ''')
+            migrate_curfew_times_to_utc(conn)
+        load_timezones()
+        load_managed_roles()
+        load_role_holds()
         logger.info("Database initialized successfully")
     except Exception as e:
-        logger.error(f"Error initializing database: {e}")
+        logger.error("Error initializing database: %s", e)
+
+    try:
+        reload_settings()
+    except ValueError as e:
+        # The error names its source: a "guild N:" or "global:" prefix means stored overrides
+        logger.error("Settings reload rejected: %s", e, extra={"event": "config_reload"})
+
+
+def migrate_curfew_times_to_utc(conn):
+    """Rewrite curfews stored with a local offset (or naive Pacific time) as UTC instants."""
+    rows = conn.execute(
+        "SELECT user_id, curfew_time, allow_time FROM curfews WHERE curfew_time NOT LIKE '%+00:00'"
+    ).fetchall()
+    for row in rows:
+        try:
+            conn.execute(
+                'UPDATE curfews SET curfew_time = ?, allow_time = ? WHERE user_id = ?',
+                (
+                    parse_stored_time(row['curfew_time']).astimezone(timezone.utc).isoformat(),
+                    parse_stored_time(row['allow_time']).astimezone(timezone.utc).isoformat(),
+                    row['user_id'],
+                ),
+            )
+        except (ValueError, TypeError) as e:
+            logger.error("Error migrating curfew for user %s: %s", row['user_id'], e, extra={"user_id": row['user_id']})
+    if rows:
+        logger.info("Migrated %s curfews to UTC", len(rows))
+
+
+def load_timezones():
+    """Load per-user and per-guild timezone overrides into memory."""
+    try:
+        with get_connection() as conn:
+            for table, key, target in (('user_settings', 'user_id', user_timezones),
+                                       ('guild_settings', 'guild_id', guild_timezones)):
+                target.clear()
+                for row in conn.execute(f'SELECT {key}, timezone FROM {table} WHERE timezone IS NOT NULL'):
+                    zone = parse_timezone(row['timezone'])
+                    if zone:
+                        target[row[key]] = zone
+    except Exception as e:
+        logger.error("Error loading timezone settings: %s", e)
+
+
+def load_managed_roles():
+    """Load the IDs of the curfew roles the bot manages into memory."""
+    try:
+        with get_connection() as conn:
+            managed_roles.clear()
+            for row in conn.execute('SELECT guild_id, role_id FROM managed_roles'):
+                managed_roles[row['guild_id']] = row['role_id']
+    except Exception as e:
+        logger.error("Error loading managed roles: %s", e)
+
+
+def set_managed_role(guild_id: int, role_id: int) -> bool:
+    """Remember which role is the bot's curfew role in a guild."""
+    try:
+        with get_connection() as conn:
+            conn.execute('''
+                INSERT INTO managed_roles (guild_id, role_id) VALUES (?, ?)
+                ON CONFLICT(guild_id) DO UPDATE SET role_id = excluded.role_id
+            ''', (guild_id, role_id))
+        managed_roles[guild_id] = role_id
+        return True
+    except Exception as e:
+        logger.error("Error saving managed role for guild %s: %s", guild_id, e, extra={"guild_id": guild_id})
+        return False
+
+
+def load_role_holds():
+    """Load the members currently holding the curfew role into memory."""
+    try:
+        with get_connection() as conn:
+            role_holds.clear()
+            for row in conn.execute('SELECT user_id, guild_id, role_id, release_at FROM role_holds'):
+                role_holds[row['user_id']] = {
+                    "guild_id": row['guild_id'],
+                    "role_id": row['role_id'],
+                    "release_at": parse_stored_time(row['release_at']),
+                }
+    except Exception as e:
+        logger.error("Error loading curfew role holders: %s", e)
+
+
+def set_role_hold(user_id: int, guild_id: int, role_id: int, release_at: datetime) -> bool:
+    """Record that a member holds the curfew role until release_at (a UTC instant)."""
+    try:
+        with get_connection() as conn:
+            conn.execute('''
+                INSERT INTO role_holds (user_id, guild_id, role_id, release_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    guild_id = excluded.guild_id, role_id = excluded.role_id, release_at = excluded.release_at
+            ''', (user_id, guild_id, role_id, release_at.isoformat()))
+        role_holds[user_id] = {"guild_id": guild_id, "role_id": role_id, "release_at": release_at}
+        return True
+    except Exception as e:
+        logger.error("Error saving curfew role holder %s: %s", user_id, e, extra={"user_id": user_id})
+        return False
+
+
+def remove_role_hold(user_id: int) -> bool:
+    """Forget a member's curfew role hold once the role is off."""
+    try:
+        with get_connection() as conn:
+            conn.execute('DELETE FROM role_holds WHERE user_id = ?', (user_id,))
+        role_holds.pop(user_id, None)
+        return True
+    except Exception as e:
+        logger.error("Error removing curfew role holder %s: %s", user_id, e, extra={"user_id": user_id})
+        return False
+
+
+def set_user_timezone(user_id: int, tz_name: Optional[str]) -> bool:
+    """Persist a user's timezone (None clears it)."""
+    try:
+        with get_connection() as conn:
+            conn.execute('''
+                INSERT INTO user_settings (user_id, timezone) VALUES (?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET timezone = excluded.timezone
+            ''', (user_id, tz_name))
+        return True
+    except Exception as e:
+        logger.error("Error setting timezone for user %s: %s", user_id, e, extra={"user_id": user_id})
+        return False
+
+
+def set_guild_timezone(guild_id: int, tz_name: Optional[str]) -> bool:
+    """Persist a guild's default timezone (None clears it)."""
+    try:
+        with get_connection() as conn:
+            conn.execute('''
+                INSERT INTO guild_settings (guild_id, timezone) VALUES (?, ?)
+                ON CONFLICT(guild_id) DO UPDATE SET timezone = excluded.timezone
+            ''', (guild_id, tz_name))
+        return True
+    except Exception as e:
+        logger.error("Error setting timezone for guild %s: %s", guild_id, e, extra={"guild_id": guild_id})
+        return False
+
+
+def get_guild_config():
+    """All setting overrides as {guild_id: {name: raw value}}, or None on error.
+
+    Global overrides are under GLOBAL_CONFIG_ID.
+    """
+    try:
+        with get_connection() as conn:
+            overrides = {}
+            for row in conn.execute('SELECT guild_id, name, value FROM guild_config'):
+                overrides.setdefault(row['guild_id'], {})[row['name']] = row['value']
+            return overrides
+    except Exception as e:
+        logger.error("Error loading guild setting overrides: %s", e)
+        return None
+
+
+def set_guild_config(guild_id: int, values: dict) -> bool:
+    """Persist a guild's setting overrides; a None value removes that override."""
+    try:
+        with get_connection() as conn:
+            for name, value in values.items():
+                if value is None:
+                    conn.execute('DELETE FROM guild_config WHERE guild_id = ? AND name = ?', (guild_id, name))
+                else:
+                    conn.execute('''
+                        INSERT INTO guild_config (guild_id, name, value) VALUES (?, ?, ?)
+                        ON CONFLICT(guild_id, name) DO UPDATE SET value = excluded.value
+                    ''', (guild_id, name, str(value)))
+        return True
+    except Exception as e:
+        logger.error("Error saving setting overrides for guild %s: %s", guild_id, e, extra={"guild_id": guild_id})
+        return False
 
 
 def add_or_update_curfew(user_name: str, user_id: int, curfew_time: str, allow_time: str) -> bool:
@@ -120,10 +772,10 @@ def add_or_update_curfew(user_name: str, user_id: int, curfew_time: str, allow_t
                     curfew_time = excluded.curfew_time,
                     allow_time = excluded.allow_time
             ''', (user_name, user_id, curfew_time, allow_time))
-        logger.info(f"Curfew updated for {user_name}")
+        logger.info("Curfew updated for %s", user_name, extra={"user_id": user_id, "event": "curfew_updated"})
         return True
     except Exception as e:
-        logger.error(f"Error updating curfew for {user_name}: {e}")
+        logger.error("Error updating curfew for %s: %s", user_name, e, extra={"user_id": user_id})
         return False
 
 
@@ -134,7 +786,7 @@ def get_user_curfew(user_id: int):
             cursor = conn.execute('SELECT * FROM curfews WHERE user_id = ?', (user_id,))
             return cursor.fetchone()
     except Exception as e:
-        logger.error(f"Error getting curfew for user {user_id}: {e}")
+        logger.error("Error getting curfew for user %s: %s", user_id, e, extra={"user_id": user_id})
         return None
 
 
@@ -145,10 +797,75 @@ def remove_user_curfew(user_id: int) -> bool:
             cursor = conn.execute('DELETE FROM curfews WHERE user_id = ?', (user_id,))
             return cursor.rowcount > 0
     except Exception as e:
-        logger.error(f"Error removing curfew for user {user_id}: {e}")
+        logger.error("Error removing curfew for user %s: %s", user_id, e, extra={"user_id": user_id})
+        return False
+
+
+def add_or_update_curfews(rows) -> bool:
+    """Bulk upsert curfews in a single transaction. rows: iterable of (user_name, user_id, curfew_time, allow_time)."""
+    try:
+        with get_connection() as conn:
+            conn.executemany('''
+                INSERT INTO curfews (user_name, user_id, curfew_time, allow_time)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    user_name = excluded.user_name,
+                    curfew_time = excluded.curfew_time,
+                    allow_time = excluded.allow_time
+            ''', rows)
+        return True
+    except Exception as e:
+        logger.error("Error bulk updating curfews: %s", e)
         return False
 
 
+def remove_user_curfews(user_ids) -> int:
+    """Bulk delete curfews in a single transaction. Returns the number of rows deleted."""
+    try:
+        with get_connection() as conn:
+            cursor = conn.executemany('DELETE FROM curfews WHERE user_id = ?', [(uid,) for uid in user_ids])
+            return cursor.rowcount
+    except Exception as e:
+        logger.error("Error bulk removing curfews: %s", e)
+        return 0
+
+
+def iter_curfews(batch_size: int = 500):
+    """Yield batches of curfew rows from a single server-side cursor, ordered by user_id."""
+    conn = get_connection()
+    try:
+        cursor = conn.execute('SELECT * FROM curfews ORDER BY user_id')
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+
+def get_curfews_page(after: Optional[tuple] = None, limit: int = 25):
+    """Get up to `limit` curfews ordered by curfew time, starting after the
+    (curfew_time, user_id) keyset cursor `after`. Cost is independent of table size."""
+    try:
+        with get_connection() as conn:
+            if after is None:
+                cursor = conn.execute(
+                    'SELECT * FROM curfews ORDER BY curfew_time, user_id LIMIT ?',
+                    (limit,),
+                )
+            else:
+                cursor = conn.execute(
+                    '''SELECT * FROM curfews WHERE (curfew_time, user_id) > (?, ?)
+                       ORDER BY curfew_time, user_id LIMIT ?''',
+                    (after[0], after[1], limit),
+                )
+            return cursor.fetchall()
+    except Exception as e:
+        logger.error("Error getting curfews page: %s", e)
+        return []
+
+
 def get_all_curfews():
     """Get all active curfews."""
     try:
@@ -156,7 +873,7 @@ def get_all_curfews():
             cursor = conn.execute('SELECT * FROM curfews')
             return cursor.fetchall()
     except Exception as e:
-        logger.error(f"Error getting all curfews: {e}")
+        logger.error("Error getting all curfews: %s", e)
         return []
 
 
@@ -168,9 +885,195 @@ def clear_all_curfews() -> bool:
         logger.info("All curfews cleared")
         return True
     except Exception as e:
-        logger.error(f"Error clearing curfews: {e}")
+        logger.error("Error clearing curfews: %s", e)
         return False
 
+STAT_COLUMNS = ('kicks', 'shames', 'appeals', 'appeals_granted', 'appeal_lead_minutes')
+
+
+def rollup_deltas(rows):
+    """Aggregate a batch of events into per-user, per-day and per-guild counter deltas."""
+    users, days, guilds = {}, {}, {}
+    for user_id, guild_id, event_type, created_at, _latency_ms, lead_minutes in rows:
+        if event_type == 'kick':
+            delta = (1, 0, 0, 0, 0.0)
+        elif event_type == 'shame':
+            delta = (0, 1, 0, 0, 0.0)
+        elif event_type in ('appeal_granted', 'appeal_denied'):
+            delta = (0, 0, 1, int(event_type == 'appeal_granted'), lead_minutes or 0.0)
+        else:
+            continue
+
+        day = datetime.fromtimestamp(created_at, guild_timezones.get(guild_id, DEFAULT_TZ)).date().isoformat()
+        for bucket, key in ((users, (user_id, guild_id)), (days, (day, guild_id)), (guilds, (guild_id,))):
+            current = bucket.get(key, (0, 0, 0, 0, 0.0))
+            bucket[key] = tuple(a + b for a, b in zip(current, delta))
+    return users, days, guilds
+
+
+def _upsert_stats(conn, table: str, key_columns: tuple, deltas: dict):
+    """Add counter deltas into a rollup table."""
+    if not deltas:
+        return
+    columns = key_columns + STAT_COLUMNS
+    updates = ', '.join(f"{col} = {col} + excluded.{col}" for col in STAT_COLUMNS)
+    conn.executemany(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+        f"ON CONFLICT({', '.join(key_columns)}) DO UPDATE SET {updates}",
+        [key + counts for key, counts in deltas.items()],
+    )
+
+
+def try_acquire_lease(holder: str, ttl: float):
+    """Acquire or renew the leader lease if it is free, expired or already ours.
+
+    Returns (acquired, previous) where previous is the lease row before this call (or None).
+    """
+    now = time.time()
+    conn = get_connection()
+    conn.isolation_level = None  # manage the transaction explicitly
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        previous = conn.execute('SELECT * FROM leader_lease WHERE id = 1').fetchone()
+        acquired = previous is None or previous['holder'] == holder or previous['expires_at'] <= now
+        if acquired:
+            conn.execute('''
+                INSERT INTO leader_lease (id, holder, expires_at, acquired_at)
+                VALUES (1, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    expires_at = excluded.expires_at,
+                    acquired_at = CASE WHEN leader_lease.holder = excluded.holder
+                                       THEN leader_lease.acquired_at ELSE excluded.acquired_at END,
+                    holder = excluded.holder
+            ''', (holder, now + ttl, now))
+        conn.execute('COMMIT')
+        return acquired, previous
+    except Exception as e:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        logger.error("Error acquiring leader lease: %s", e)
+        return False, None
+    finally:
+        conn.close()
+
+
+def release_lease(holder: str):
+    """Expire our lease immediately so a standby can take over without waiting out the TTL."""
+    try:
+        with get_connection() as conn:
+            # Expire it now rather than at 0, so the takeover log's handover gap stays meaningful
+            conn.execute('UPDATE leader_lease SET expires_at = ? WHERE id = 1 AND holder = ?', (time.time(), holder))
+    except Exception as e:
+        logger.error("Error releasing leader lease: %s", e)
+
+
+def insert_events(rows) -> bool:
+    """Append a batch of events and fold them into the rollup tables in one transaction.
+
+    rows: (user_id, guild_id, event_type, created_at, latency_ms, lead_minutes)
+    """
+    users, days, guilds = rollup_deltas(rows)
+    try:
+        with get_connection() as conn:
+            conn.executemany('''
+                INSERT INTO events (user_id, guild_id, event_type, created_at, latency_ms)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [row[:5] for row in rows])
+            _upsert_stats(conn, 'user_stats', ('user_id', 'guild_id'), users)
+            _upsert_stats(conn, 'daily_stats', ('day', 'guild_id'), days)
+            _upsert_stats(conn, 'guild_stats', ('guild_id',), guilds)
+        return True
+    except Exception as e:
+        logger.error("Error writing %s events: %s", len(rows), e)
+        return False
+
+
+def get_user_stats(user_id: int, guild_id: int):
+    """Get a user's rollup counters (primary-key lookup)."""
+    try:
+        with get_connection() as conn:
+            cursor = conn.execute(
+                'SELECT * FROM user_stats WHERE user_id = ? AND guild_id = ?', (user_id, guild_id)
+            )
+            return cursor.fetchone()
+    except Exception as e:
+        logger.error("Error getting stats for user %s: %s", user_id, e, extra={"user_id": user_id})
+        return None
+
+
+def get_guild_stats(guild_id: int, day: str, top: int = 5):
+    """Get guild totals, today's counters and the top kicked users. Returns (totals, today, top_rows)."""
+    try:
+        with get_connection() as conn:
+            totals = conn.execute('SELECT * FROM guild_stats WHERE guild_id = ?', (guild_id,)).fetchone()
+            today = conn.execute(
+                'SELECT * FROM daily_stats WHERE day = ? AND guild_id = ?', (day, guild_id)
+            ).fetchone()
+            top_rows = conn.execute('''
+                SELECT * FROM user_stats WHERE guild_id = ? AND kicks > 0
+                ORDER BY kicks DESC LIMIT ?
+            ''', (guild_id, top)).fetchall()
+            return totals, today, top_rows
+    except Exception as e:
+        logger.error("Error getting stats for guild %s: %s", guild_id, e, extra={"guild_id": guild_id})
+        return None, None, []
+
+
+def stats_row_to_dict(row) -> dict:
+    """Counters plus derived appeal win rate and average appeal lead time."""
+    if row is None:
+        row = dict.fromkeys(STAT_COLUMNS, 0)
+    appeals = row['appeals']
+    return {
+        "kicks": row['kicks'],
+        "shames": row['shames'],
+        "appeals": appeals,
+        "appeals_granted": row['appeals_granted'],
+        "appeal_win_rate": round(row['appeals_granted'] / appeals, 3) if appeals else None,
+        "avg_appeal_minutes_before_curfew": round(row['appeal_lead_minutes'] / appeals, 1) if appeals else None,
+    }
+
+
+def prune_events(retention_days: int) -> int:
+    """Delete events older than the retention window. Returns the number of rows deleted."""
+    cutoff = time.time() - retention_days * 86400
+    try:
+        with get_connection() as conn:
+            cursor = conn.execute('DELETE FROM events WHERE created_at < ?', (cutoff,))
+            return cursor.rowcount
+    except Exception as e:
+        logger.error("Error pruning events: %s", e)
+        return 0
+
+
+def export_events_csv_gz(since: float) -> bytes:
+    """Export events newer than `since` (unix time) as gzipped CSV."""
+    buf = io.BytesIO()
+    conn = get_connection()
+    try:
+        with gzip.GzipFile(fileobj=buf, mode='wb') as gz:
+            text = io.TextIOWrapper(gz, encoding='utf-8', newline='')
+            writer = csv.writer(text)
+            writer.writerow(['created_at', 'event_type', 'user_id', 'guild_id', 'latency_ms'])
+            cursor = conn.execute('''
+                SELECT created_at, event_type, user_id, guild_id, latency_ms
+                FROM events WHERE created_at >= ? ORDER BY created_at
+            ''', (since,))
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                writer.writerows(
+                    (int(r['created_at']), r['event_type'], r['user_id'], r['guild_id'],
+                     '' if r['latency_ms'] is None else round(r['latency_ms']))
+                    for r in rows
+                )
+            text.flush()
+            text.detach()
+    finally:
+        conn.close()
+    return buf.getvalue()
+
 # ---------------------------------------------------------------------------
 # Health check HTTP server
 # ---------------------------------------------------------------------------
@@ -178,219 +1081,1138 @@ def clear_all_curfews() -> bool:
 async def health_handler(request):
     """Return 200 if bot is connected to Discord, 503 otherwise."""
     if bot.is_ready():
+        if HA_ENABLED:
+            return web.Response(text="OK (leader)" if is_leader() else "OK (standby)", status=200)
         return web.Response(text="OK", status=200)
     return web.Response(text="Bot not ready", status=503)
 
 
 async def start_health_server():
-    """Start a lightweight HTTP health check server."""
+    """Start a lightweight HTTP health check server (plus the admin API if enabled)."""
     global _health_runner
     app = web.Application()
     app.router.add_get('/health', health_handler)
+    if ADMIN_API_TOKEN:
+        register_admin_routes(app)
+        logger.info("Admin API enabled")
     _health_runner = web.AppRunner(app)
     await _health_runner.setup()
     site = web.TCPSite(_health_runner, HEALTH_HOST, HEALTH_PORT)
     await site.start()
-    logger.info(f"Health check server started on {HEALTH_HOST}:{HEALTH_PORT}")
+    logger.info("Health check server started on %s:%s", HEALTH_HOST, HEALTH_PORT)
+
+# ---------------------------------------------------------------------------
+# Admin HTTP API — bearer-token authenticated, served by the health server
+# ---------------------------------------------------------------------------
+
+def require_admin_token(handler):
+    """Reject requests that don't carry the configured ADMIN_API_TOKEN."""
+    async def wrapper(request):
+        auth = request.headers.get('Authorization', '')
+        token = auth[7:] if auth.startswith('Bearer ') else ''
+        if not token or not hmac.compare_digest(token, ADMIN_API_TOKEN):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        if not is_leader():
+            return web.json_response({"error": "standby instance, send requests to the leader"}, status=503)
+        return await handler(request)
+    return wrapper
+
+
+def curfew_row_to_dict(row) -> dict:
+    """Serialize a curfews row for the admin API."""
+    return {
+        "user_id": row['user_id'],
+        "user_name": row['user_name'],
+        "curfew_time": row['curfew_time'],
+        "allow_time": row['allow_time'],
+    }
+
+
+async def get_or_fetch_member(guild, user_id: int):
+    """The guild member with this ID, or None if they aren't in the guild.
+
+    Without the members intent the cache only holds members currently in voice,
+    so a cache miss falls back to the API like the Member converter does.
+    """
+    member = guild.get_member(user_id)
+    if member is None:
+        try:
+            member = await guild.fetch_member(user_id)
+        except discord.NotFound:
+            return None
+    return member
+
+
+@require_admin_token
+async def api_list_curfews(request):
+    """Stream all curfews as NDJSON, one batch at a time from a DB cursor."""
+    response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+    await response.prepare(request)
+    for rows in iter_curfews():
+        chunk = ''.join(json.dumps(curfew_row_to_dict(row)) + '\n' for row in rows)
+        await response.write(chunk.encode())
+    await response.write_eof()
+    return response
+
+
+@require_admin_token
+async def api_get_curfew(request):
+    """Look up a single user's curfew."""
+    try:
+        user_id = int(request.match_info['user_id'])
+    except ValueError:
+        return web.json_response({"error": "invalid user_id"}, status=400)
+
+    row = get_user_curfew(user_id)
+    if not row:
+        return web.json_response({"error": "not found"}, status=404)
+    return web.json_response(curfew_row_to_dict(row))
+
+
+@require_admin_token
+async def api_upsert_curfews(request):
+    """Bulk set curfews. Body: {"curfews": [{"user_id": 123, "time": "11:30PM"}, ...]}
+
+    Times are wall-clock times in each user's configured timezone.
+    """
+    try:
+        body = await request.json()
+        entries = body["curfews"]
+        if not isinstance(entries, list):
+            raise TypeError("curfews must be a list")
+    except (ValueError, KeyError, TypeError) as e:
+        return web.json_response({"error": f"invalid body: {e}"}, status=400)
+
+    target_guild = bot.get_guild(GUILD_ID)
+    if not target_guild:
+        return web.json_response({"error": "guild not available"}, status=503)
+
+    valid = []     # (member, parsed_time)
+    accepted = []  # (member, curfew_dt, allow_dt)
+    errors = []
+    for entry in entries:
+        try:
+            user_id = int(entry["user_id"])
+            parsed_time = parse_time_str(str(entry["time"]))
+        except (KeyError, TypeError, ValueError):
+            errors.append({"entry": entry, "error": "expected user_id and time"})
+            continue
+
+        if parsed_time is None:
+            errors.append({"user_id": user_id, "error": "invalid time format"})
+            continue
+        if user_id in get_settings(target_guild.id)['EXCLUDED_USERS']:
+            errors.append({"user_id": user_id, "error": "user is excluded from curfews"})
+            continue
+        try:
+            member = await get_or_fetch_member(target_guild, user_id)
+        except discord.HTTPException as e:
+            errors.append({"user_id": user_id, "error": f"member lookup failed: {e}"})
+            continue
+        if not member:
+            errors.append({"user_id": user_id, "error": "member not found"})
+            continue
+
+        valid.append((member, parsed_time))
+
+    # Wait out any appeal or command in flight for these users before touching them
+    async with user_locks.hold_many(member.id for member, _ in valid):
+        now = utcnow()
+        for member, parsed_time in valid:
+            tz = resolve_timezone(member.id, target_guild.id)
+            curfew_dt, allow_dt = next_curfew_window(parsed_time, tz, now)
+            accepted.append((member, curfew_dt, allow_dt))
+
+        if accepted:
+            rows = [
+                (member.display_name, member.id, curfew_dt.isoformat(), allow_dt.isoformat())
+                for member, curfew_dt, allow_dt in accepted
+            ]
+            if not add_or_update_curfews(rows):
+                return web.json_response({"error": "database write failed"}, status=500)
+
+            for member, curfew_dt, _ in accepted:
+                cancel_user_tasks(member.id)
+                appeal_state.pop(member.id, None)
+                schedule_user_tasks(member, curfew_dt, now)
+            for member, _, _ in accepted:
+                await lift_curfew_role(target_guild, member.id)
+
+    logger.info("Admin API set %s curfews (%s rejected)", len(accepted), len(errors))
+    return web.json_response({
+        "updated": [
+            {"user_id": member.id, "curfew_time": curfew_dt.isoformat(), "allow_time": allow_dt.isoformat()}
+            for member, curfew_dt, allow_dt in accepted
+        ],
+        "errors": errors,
+    })
+
+
+@require_admin_token
+async def api_delete_curfews(request):
+    """Bulk remove curfews. Body: {"user_ids": [123, 456, ...]}"""
+    try:
+        body = await request.json()
+        user_ids = [int(uid) for uid in body["user_ids"]]
+    except (ValueError, KeyError, TypeError) as e:
+        return web.json_response({"error": f"invalid body: {e}"}, status=400)
+
+    async with user_locks.hold_many(user_ids):
+        for user_id in user_ids:
+            cancel_user_tasks(user_id)
+            appeal_state.pop(user_id, None)
+        removed = remove_user_curfews(user_ids)
+
+        target_guild = bot.get_guild(GUILD_ID)
+        if target_guild:
+            for user_id in user_ids:
+                await lift_curfew_role(target_guild, user_id)
+
+    logger.info("Admin API removed %s curfews", removed)
+    return web.json_response({"removed": removed})
+
+
+@require_admin_token
+async def api_stats(request):
+    """Guild stats and leaderboard, or a single user's stats with ?user_id=."""
+    try:
+        guild_id = int(request.query.get('guild_id', GUILD_ID))
+        user_id = request.query.get('user_id')
+        user_id = int(user_id) if user_id is not None else None
+    except ValueError:
+        return web.json_response({"error": "invalid guild_id or user_id"}, status=400)
+
+    await flush_events()
+    if user_id is not None:
+        row = await asyncio.to_thread(get_user_stats, user_id, guild_id)
+        return web.json_response({"user_id": user_id, "guild_id": guild_id, **stats_row_to_dict(row)})
+
+    today = utcnow().astimezone(guild_timezones.get(guild_id, DEFAULT_TZ)).date().isoformat()
+    totals, today_row, top_rows = await asyncio.to_thread(get_guild_stats, guild_id, today)
+    return web.json_response({
+        "guild_id": guild_id,
+        "totals": stats_row_to_dict(totals),
+        "today": stats_row_to_dict(today_row),
+        "most_kicked": [{"user_id": row['user_id'], "kicks": row['kicks']} for row in top_rows],
+    })
+
+
+@require_admin_token
+async def api_metrics(request):
+    """Runtime counters: per-user lock contention, log and event drops, AI ruling cache hits."""
+    return web.json_response({
+        "user_locks": user_locks.metrics(),
+        "logging": {**log_stats, "queued": _log_listener.queue.qsize()},
+        "events": {**event_stats, "buffered": len(_event_buffer)},
+        "ai_ruling_cache": ruling_cache.metrics(),
+    })
+
+
+@require_admin_token
+async def api_get_config(request):
+    """Effective settings, for one guild with ?guild_id=."""
+    try:
+        guild_id = int(request.query.get('guild_id', GUILD_ID))
+    except ValueError:
+        return web.json_response({"error": "invalid guild_id"}, status=400)
+    return web.json_response({
+        "guild_id": guild_id,
+        "settings": settings_to_dict(get_settings(guild_id)),
+        "global_overrides": settings.guild_raw.get(GLOBAL_CONFIG_ID, {}),
+        "overrides": settings.guild_raw.get(guild_id, {}),
+    })
+
+
+@require_admin_token
+async def api_reload_config(request):
+    """Re-read settings from the environment/.env and the database."""
+    try:
+        changed = reload_settings()
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+    return web.json_response({"changed": changed})
+
+
+@require_admin_token
+async def api_set_guild_config(request):
+    """Set or clear per-guild overrides, or global ones on /api/config/global.
+
+    Body: {"APPEAL_GRANT_RATE": "0.5", "SHAME_CHANNEL": null}
+    """
+    try:
+        guild_id = int(request.match_info.get('guild_id', GLOBAL_CONFIG_ID))
+        body = await request.json()
+        if not isinstance(body, dict):
+            raise TypeError("expected an object of setting names to values")
+    except (ValueError, TypeError) as e:
+        return web.json_response({"error": f"invalid request: {e}"}, status=400)
+
+    # Validate the complete result before anything is stored
+    guild_raw = {gid: dict(values) for gid, values in settings.guild_raw.items()}
+    current = guild_raw.setdefault(guild_id, {})
+    for name, value in body.items():
+        if value is None:
+            current.pop(name, None)
+        else:
+            current[name] = str(value)
+    try:
+        new = Settings(settings.raw, guild_raw)
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+
+    if not set_guild_config(guild_id, body):
+        return web.json_response({"error": "database write failed"}, status=500)
+    swap_settings(new)
+    return web.json_response({
+        "guild_id": guild_id,
+        "settings": settings_to_dict(get_settings(guild_id)),
+        "overrides": settings.guild_raw.get(guild_id, {}),
+    })
+
+
+def register_admin_routes(app: web.Application):
+    """Attach the admin API routes to the aiohttp app."""
+    app.router.add_get('/api/curfews', api_list_curfews)
+    app.router.add_post('/api/curfews', api_upsert_curfews)
+    app.router.add_delete('/api/curfews', api_delete_curfews)
+    app.router.add_get('/api/curfews/{user_id}', api_get_curfew)
+    app.router.add_get('/api/stats', api_stats)
+    app.router.add_get('/api/metrics', api_metrics)
+    app.router.add_get('/api/config', api_get_config)
+    app.router.add_post('/api/config/reload', api_reload_config)
+    app.router.add_put('/api/config/guilds/{guild_id}', api_set_guild_config)
+    app.router.add_put('/api/config/global', api_set_guild_config)
 
 # ---------------------------------------------------------------------------
 # Task scheduling helpers
 # ---------------------------------------------------------------------------
 
+class UserLocks:
+    """Per-user asyncio locks so mutations of one user's curfew run one at a time.
+
+    Entries are refcounted and dropped once no coroutine holds or waits on them,
+    so memory is bounded by the number of users with an operation in flight.
+    Different users never wait on each other.
+    """
+
+    def __init__(self):
+        self._locks = {}  # {user_id: [asyncio.Lock, holders + waiters]}
+        self.acquired = 0
+        self.contended = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    @contextlib.asynccontextmanager
+    async def hold(self, user_id: int):
+        entry = self._locks.get(user_id)
+        if entry is None:
+            entry = self._locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            lock = entry[0]
+            if lock.locked():
+                self.contended += 1
+                started = time.monotonic()
+                await lock.acquire()
+                waited_ms = (time.monotonic() - started) * 1000
+                self.wait_ms_total += waited_ms
+                self.wait_ms_max = max(self.wait_ms_max, waited_ms)
+            else:
+                await lock.acquire()
+            self.acquired += 1
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[user_id]
+
+    @contextlib.asynccontextmanager
+    async def hold_many(self, user_ids):
+        """Hold several users' locks at once, taken in sorted order so callers can't deadlock."""
+        async with contextlib.AsyncExitStack() as stack:
+            for user_id in sorted(set(user_ids)):
+                await stack.enter_async_context(self.hold(user_id))
+            yield
+
+    def metrics(self) -> dict:
+        return {
+            "active_users": len(self._locks),
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "contention_rate": round(self.contended / self.acquired, 4) if self.acquired else 0.0,
+            "wait_ms_total": round(self.wait_ms_total, 2),
+            "wait_ms_max": round(self.wait_ms_max, 2),
+        }
+
+
+user_locks = UserLocks()
+
+
 def cancel_user_tasks(user_id: int):
     """Cancel all scheduled tasks (kick + reminder) for a user."""
+    scheduled_due.pop(user_id, None)
     tasks = scheduled_tasks.pop(user_id, None)
     if tasks:
         for task in tasks.values():
             if task is not None:
                 task.cancel()
 
+
+def schedule_user_tasks(member, curfew_dt: datetime, now: datetime):
+    """Schedule the kick and 5-minute reminder for a member's curfew.
+
+    Callers are responsible for cancelling any existing tasks first.
+    """
+    # Deadlines are fixed here, not when the tasks first run, so loop delays can't shift them
+    time_diff = (curfew_dt - now).total_seconds()
+    scheduled_at = clock.monotonic()
+    kick_task = asyncio.create_task(kick_after_delay(member, scheduled_at + time_diff))
+
+    reminder_task = None
+    reminder_delay = max(0, time_diff - 300)
+    if reminder_delay > 0:
+        reminder_task = asyncio.create_task(schedule_reminder(member, scheduled_at + reminder_delay))
+
+    scheduled_tasks[member.id] = {"kick": kick_task, "reminder": reminder_task}
+    scheduled_due[member.id] = curfew_dt.timestamp()
+
+
+def clear_user_curfew(user_id: int) -> bool:
+    """Cancel tasks, reset appeal state and delete a user's curfew. Returns True if a row was deleted."""
+    cancel_user_tasks(user_id)
+    appeal_state.pop(user_id, None)
+    return remove_user_curfew(user_id)
+
+
+def parse_time_str(time_str: str):
+    """Parse a curfew time string (supports "11:30PM" and "11:30 PM"). Returns None if invalid."""
+    for fmt in ('%I:%M%p', '%I:%M %p'):
+        try:
+            return datetime.strptime(time_str, fmt).time()
+        except ValueError:
+            continue
+    return None
+
+
+def next_curfew_window(parsed_time, tz: ZoneInfo, now: datetime):
+    """Return UTC (curfew_dt, allow_dt) for the next occurrence of parsed_time in tz."""
+    local_today = now.astimezone(tz).date()
+    curfew_dt = wall_to_utc(tz.key, local_today, parsed_time)
+
+    # If the curfew time already passed today, schedule for tomorrow (same wall time, across DST)
+    if curfew_dt <= now:
+        curfew_dt = wall_to_utc(tz.key, local_today + timedelta(days=1), parsed_time)
+
+    # Allow time = 5 minutes after curfew
+    return curfew_dt, curfew_dt + timedelta(minutes=5)
+
+# ---------------------------------------------------------------------------
+# Time zone helpers — everything internal is a UTC instant; zones are only
+# resolved from the in-memory override dicts at command input and display
+# ---------------------------------------------------------------------------
+
+class SystemClock:
+    """Real time. The scheduler, appeal checks, shame rate limit and AI budget all read
+    time through the module-level `clock` so simulations can swap in a VirtualClock."""
+
+    def now(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+
+class VirtualClock:
+    """Clock that only moves when advance() is called. Sleepers wake in due order,
+    each seeing now() equal to its exact due time."""
+
+    def __init__(self, start: datetime):
+        self._start = start
+        self._elapsed = 0.0
+        self._sleepers = []  # heap of (due, seq, future)
+        self._seq = itertools.count()
+
+    def now(self) -> datetime:
+        return self._start + timedelta(seconds=self._elapsed)
+
+    def monotonic(self) -> float:
+        return self._elapsed
+
+    async def sleep(self, seconds: float):
+        if seconds <= 0:
+            await asyncio.sleep(0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._sleepers, (self._elapsed + seconds, next(self._seq), future))
+        await future
+
+    async def advance(self, seconds: float):
+        """Move time forward, waking every sleeper due on the way and letting it run."""
+        target = self._elapsed + seconds
+        # Let freshly created tasks reach their first sleep before time moves
+        for _ in range(10):
+            await asyncio.sleep(0)
+        while self._sleepers and self._sleepers[0][0] <= target:
+            due = self._sleepers[0][0]
+            self._elapsed = max(self._elapsed, due)
+            while self._sleepers and self._sleepers[0][0] == due:
+                _, _, future = heapq.heappop(self._sleepers)
+                if not future.done():
+                    future.set_result(None)
+            # Give woken tasks a few loop turns to finish their (stubbed) I/O
+            for _ in range(10):
+                await asyncio.sleep(0)
+        self._elapsed = target
+
+    async def advance_to(self, when: datetime):
+        """Advance until now() == when (no-op if already past)."""
+        delta = (when - self.now()).total_seconds()
+        if delta > 0:
+            await self.advance(delta)
+
+
+clock = SystemClock()
+
+
+def utcnow() -> datetime:
+    """Current time as an aware UTC datetime, from the active clock."""
+    return clock.now()
+
+
+def parse_timezone(name: str) -> Optional[ZoneInfo]:
+    """Return the ZoneInfo for an IANA name, or None if it isn't a known zone."""
+    try:
+        return get_zone(name.strip())
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def resolve_timezone(user_id: int, guild_id: Optional[int] = None) -> ZoneInfo:
+    """User override, then guild override, then DEFAULT_TIMEZONE."""
+    zone = user_timezones.get(user_id)
+    if zone is None and guild_id is not None:
+        zone = guild_timezones.get(guild_id)
+    return zone or DEFAULT_TZ
+
+
+@lru_cache(maxsize=4096)
+def wall_to_utc(zone_name: str, day, wall_time) -> datetime:
+    """Convert a local wall-clock date/time to a UTC instant. Cached, so each
+    zone's DST transition lookup happens once per distinct day and time."""
+    return datetime.combine(day, wall_time, tzinfo=get_zone(zone_name)).astimezone(timezone.utc)
+
+
+def parse_stored_time(value: str) -> datetime:
+    """Parse a stored ISO curfew time. Legacy naive values are Pacific wall-clock times."""
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=get_zone('America/Los_Angeles'))
+    return dt
+
+
+def format_local(dt: datetime, tz: ZoneInfo) -> str:
+    """Render an instant as e.g. '11:30 PM PDT' in the given zone."""
+    return dt.astimezone(tz).strftime('%I:%M %p %Z')
+
+# ---------------------------------------------------------------------------
+# Enforcement event log — record_event() only appends to memory; the flush
+# loop writes batches in a worker thread so handlers never wait on disk
+# ---------------------------------------------------------------------------
+
+_event_buffer = []
+event_stats = {"dropped": 0, "requeued": 0}
+
+
+def record_event(member, event_type: str, latency_ms: Optional[float] = None,
+                 lead_minutes: Optional[float] = None):
+    """Buffer an enforcement event (kick, shame, reminder, appeal_granted, appeal_denied).
+
+    lead_minutes is how long before curfew an appeal was filed; it feeds the stats rollups.
+    """
+    if len(_event_buffer) >= EVENT_BUFFER_MAX:
+        event_stats["dropped"] += 1
+        return
+    _event_buffer.append((member.id, member.guild.id, event_type, clock.now().timestamp(), latency_ms, lead_minutes))
+
+
+def drain_events():
+    """Take everything currently buffered."""
+    global _event_buffer
+    batch, _event_buffer = _event_buffer, []
+    return batch
+
+
+def requeue_events(batch):
+    """Put a batch that failed to write back in front of anything buffered since, up to EVENT_BUFFER_MAX."""
+    global _event_buffer
+    combined = batch + _event_buffer
+    _event_buffer = combined[:EVENT_BUFFER_MAX]
+    event_stats["requeued"] += len(batch)
+    event_stats["dropped"] += len(combined) - len(_event_buffer)
+
+
+async def flush_events():
+    """Write buffered events to the database in a single transaction, keeping them if that fails."""
+    batch = drain_events()
+    if batch and not await asyncio.to_thread(insert_events, batch):
+        requeue_events(batch)
+
+
+async def event_flush_loop():
+    """Periodically flush buffered events and prune those past retention."""
+    last_prune = 0.0
+    while True:
+        try:
+            await asyncio.sleep(EVENT_FLUSH_INTERVAL)
+            await flush_events()
+            if time.time() - last_prune >= 3600:
+                pruned = await asyncio.to_thread(prune_events, EVENT_RETENTION_DAYS)
+                last_prune = time.time()
+                if pruned:
+                    logger.info("Pruned %s events older than %s days", pruned, EVENT_RETENTION_DAYS)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error("Error flushing events: %s", e)
+
+# ---------------------------------------------------------------------------
+# Gateway recorder — appends voice updates and curfew/appeal commands as
+# compact NDJSON to RECORD_PATH for src/replay.py. Writes go to a 64KB
+# buffered file, so handlers rarely touch disk.
+#
+#   {"t": unix_ts, "e": "v", "u": user_id, "n": name, "b": before_channel_id, "a": after_channel_id}
+#   {"t": unix_ts, "e": "curfew", "u": admin_id, "m": member_id, "n": member_name, "time": "11:30PM"}
+#   {"t": unix_ts, "e": "appeal", "u": user_id, "n": name, "reason": "..."}
+# ---------------------------------------------------------------------------
+
+_recorder_file = None
+
+
+def open_recorder():
+    """Open RECORD_PATH for appending if recording is enabled."""
+    global _recorder_file
+    if RECORD_PATH and _recorder_file is None:
+        _recorder_file = open(RECORD_PATH, 'a', encoding='utf-8', buffering=1 << 16)
+        logger.info("Recording gateway events to %s", RECORD_PATH)
+
+
+def close_recorder():
+    """Flush and close the recording file."""
+    global _recorder_file
+    if _recorder_file is not None:
+        _recorder_file.close()
+        _recorder_file = None
+
+
+def record_gateway(kind: str, **fields):
+    """Append one gateway event to the recording, if enabled."""
+    if _recorder_file is None:
+        return
+    fields["t"] = round(time.time(), 3)
+    fields["e"] = kind
+    _recorder_file.write(json.dumps(fields, separators=(',', ':')) + "\n")
+
+# ---------------------------------------------------------------------------
+# State snapshots — gzipped NDJSON, one record per line, written and read
+# incrementally. Records carry stored values as-is so an import restores
+# memory and schedules without re-parsing curfews.
+#
+#   {"t": "header", "v": 1, "created_at": ...}
+#   {"t": "curfew", "u": user_id, "n": user_name, "c": curfew_time, "a": allow_time}
+#   {"t": "appeal", "u": user_id, "count": int, "last": unix_ts | null}
+#   {"t": "shame", "u": user_id, "last": unix_ts}
+#   {"t": "sched", "u": user_id, "due": unix_ts}
+#   {"t": "tz", "scope": "user" | "guild", "id": int, "zone": name}
+# ---------------------------------------------------------------------------
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_PATH = os.path.join(DB_DIR, "state_snapshot.ndjson.gz")
+
+
+def capture_memory_state():
+    """Copy the in-memory state into snapshot records (runs on the event loop)."""
+    records = []
+    for user_id, state in appeal_state.items():
+        last = state["last_attempt"]
+        records.append({"t": "appeal", "u": user_id, "count": state["count"],
+                        "last": last.timestamp() if last else None})
+    for user_id, last in last_shame_time.items():
+        records.append({"t": "shame", "u": user_id, "last": last.timestamp()})
+    for user_id, due in scheduled_due.items():
+        records.append({"t": "sched", "u": user_id, "due": due})
+    for user_id, zone in user_timezones.items():
+        records.append({"t": "tz", "scope": "user", "id": user_id, "zone": zone.key})
+    for guild_id, zone in guild_timezones.items():
+        records.append({"t": "tz", "scope": "guild", "id": guild_id, "zone": zone.key})
+    return records
+
+
+def write_snapshot(path: str, memory_records) -> int:
+    """Stream curfew rows and captured memory state to a gzipped NDJSON file. Returns records written."""
+    written = 0
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({"t": "header", "v": SNAPSHOT_VERSION, "created_at": time.time()}) + "\n")
+        for rows in iter_curfews():
+            f.writelines(
+                json.dumps({"t": "curfew", "u": row['user_id'], "n": row['user_name'],
+                            "c": row['curfew_time'], "a": row['allow_time']}, separators=(',', ':')) + "\n"
+                for row in rows
+            )
+            written += len(rows)
+        for record in memory_records:
+            f.write(json.dumps(record, separators=(',', ':')) + "\n")
+            written += 1
+    os.replace(tmp_path, path)
+    return written
+
+
+def snapshot_user_ids(path: str):
+    """First pass over a snapshot: (user IDs with a curfew record, every user ID it touches)."""
+    curfew_users, users = set(), set()
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "u" in record:
+                users.add(record["u"])
+                if record.get("t") == "curfew":
+                    curfew_users.add(record["u"])
+    return curfew_users, users
+
+
+def read_snapshot(path: str, batch_size: int = 500):
+    """Stream a snapshot file: curfews go straight to the DB in batches, everything else
+    is returned for apply_memory_state(). Raises ValueError on a bad or newer header."""
+    memory_records = []
+    curfews = 0
+    batch = []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline() or '{}')
+        if header.get("t") != "header" or not isinstance(header.get("v"), int):
+            raise ValueError("not a CurfewBot state snapshot")
+        if header["v"] > SNAPSHOT_VERSION:
+            raise ValueError(f"snapshot version {header['v']} is newer than supported ({SNAPSHOT_VERSION})")
+
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("t") == "curfew":
+                batch.append((record["n"], record["u"], record["c"], record["a"]))
+                if len(batch) >= batch_size:
+                    if not add_or_update_curfews(batch):
+                        raise ValueError("database write failed")
+                    curfews += len(batch)
+                    batch = []
+            else:
+                memory_records.append(record)
+
+    if batch:
+        if not add_or_update_curfews(batch):
+            raise ValueError("database write failed")
+        curfews += len(batch)
+    return curfews, memory_records
+
+
+async def apply_memory_state(records):
+    """Load snapshot memory records and re-arm pending schedules.
+
+    Returns (schedules restored, schedules skipped because the member is gone or the kick is past).
+    """
+    target_guild = bot.get_guild(GUILD_ID)
+    now = utcnow()
+    restored = skipped = 0
+    for record in records:
+        kind = record.get("t")
+        try:
+            if kind == "appeal":
+                last = record["last"]
+                appeal_state[record["u"]] = {
+                    "count": record["count"],
+                    "last_attempt": datetime.fromtimestamp(last, timezone.utc) if last else None,
+                }
+            elif kind == "shame":
+                last_shame_time[record["u"]] = datetime.fromtimestamp(record["last"], timezone.utc)
+            elif kind == "tz":
+                zone = parse_timezone(record["zone"])
+                if zone is None:
+                    continue
+                if record["scope"] == "user":
+                    set_user_timezone(record["id"], zone.key)
+                    user_timezones[record["id"]] = zone
+                else:
+                    set_guild_timezone(record["id"], zone.key)
+                    guild_timezones[record["id"]] = zone
+            elif kind == "sched" and target_guild:
+                due = datetime.fromtimestamp(record["due"], timezone.utc)
+                member = await get_or_fetch_member(target_guild, record["u"]) if due > now else None
+                if member:
+                    cancel_user_tasks(member.id)
+                    schedule_user_tasks(member, due, now)
+                    restored += 1
+                else:
+                    skipped += 1
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error("Skipping bad snapshot record %s: %s", record, e)
+        except discord.HTTPException as e:
+            skipped += 1
+            logger.error("Skipping schedule for user %s: %s", record.get("u"), e, extra={"user_id": record.get("u")})
+    return restored, skipped
+
+# ---------------------------------------------------------------------------
+# Active/standby HA — only the lease holder enforces. The standby stays
+# connected to the gateway and keeps a parsed copy of the curfew table so a
+# takeover only has to schedule tasks.
+# ---------------------------------------------------------------------------
+
+_lease_expires_at = 0.0
+_leading = False  # whether this instance is currently acting as leader (HA only)
+_warm_schedule = []  # standby's pre-parsed [(user_id, curfew_dt, allow_dt)]
+
+
+def is_leader() -> bool:
+    """True if this instance should enforce curfews. Always True when HA is off."""
+    return not HA_ENABLED or time.time() < _lease_expires_at
+
+
+def cancel_all_tasks():
+    """Cancel every scheduled kick and reminder."""
+    for tasks in scheduled_tasks.values():
+        for task in tasks.values():
+            if task is not None:
+                task.cancel()
+    scheduled_tasks.clear()
+    scheduled_due.clear()
+
+
+def step_down(reason: str):
+    """Stop enforcing: cancel every kick, reminder and role release this instance scheduled."""
+    global _leading
+    _leading = False
+    logger.warning("Standing by: %s", reason)
+    cancel_all_tasks()
+
+
+async def lease_loop():
+    """Renew the lease as leader; as standby, refresh the warm schedule and try to take over."""
+    global _lease_expires_at, _warm_schedule, _leading
+    interval = HA_LEASE_SECONDS / 3
+
+    while True:
+        try:
+            # The lease can lapse between passes (slow renewal, failed attempts); step down
+            # on any leading -> not leading change, not only when a renewal is refused
+            if _leading and not is_leader():
+                step_down("leader lease lapsed")
+            if not _leading:
+                _warm_schedule = await asyncio.to_thread(load_curfew_schedule)
+
+            attempt_started = time.time()
+            acquired, previous = await asyncio.to_thread(try_acquire_lease, HA_INSTANCE_ID, HA_LEASE_SECONDS)
+
+            if acquired:
+                _lease_expires_at = attempt_started + HA_LEASE_SECONDS
+                if not _leading:
+                    _leading = True
+                    # Overrides and curfew role holders may have changed while the other instance led
+                    try:
+                        reload_settings()
+                    except ValueError as e:
+                        logger.error("Keeping current settings, reload failed: %s", e, extra={"event": "config_reload"})
+                    load_managed_roles()
+                    load_role_holds()
+                    restore_started = time.monotonic()
+                    await restore_curfews_from_db(_warm_schedule)
+                    restore_ms = (time.monotonic() - restore_started) * 1000
+                    if previous is not None and previous['holder'] != HA_INSTANCE_ID:
+                        gap = attempt_started - previous['expires_at']
+                        logger.info(
+                            "Took over as leader from %s: lease expired %.1fs ago, %s schedules restored in %.0fms",
+                            previous['holder'], gap, len(scheduled_tasks), restore_ms, extra={"event": "ha_takeover"},
+                        )
+                    else:
+                        logger.info("Acquired leader lease, %s schedules restored in %.0fms", len(scheduled_tasks), restore_ms)
+            elif _leading and not is_leader():
+                step_down(f"lost leader lease to {previous['holder'] if previous else 'unknown'}")
+
+            await asyncio.sleep(interval)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error("Error in lease loop: %s", e)
+            await asyncio.sleep(interval)
+
+
+async def claim_lease_without_ha() -> bool:
+    """HA off: take the lease anyway, so an instance started with HA on against the same
+    DB_DIR stands by instead of enforcing alongside us. False if someone else holds it."""
+    acquired, previous = await asyncio.to_thread(try_acquire_lease, HA_INSTANCE_ID, HA_LEASE_SECONDS)
+    if not acquired and previous is not None:
+        logger.error(
+            "HA_ENABLED is off but %s holds the leader lease on this database; "
+            "enable HA on every instance sharing DB_DIR", previous['holder'], extra={"event": "ha_conflict"},
+        )
+        return False
+    return True
+
+
+async def hold_lease_loop():
+    """HA off: keep renewing the lease; shut down if another instance has taken it."""
+    while True:
+        try:
+            await asyncio.sleep(HA_LEASE_SECONDS / 3)
+            if not await claim_lease_without_ha():
+                asyncio.create_task(shutdown())
+                return
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error("Error in lease loop: %s", e)
+
+
+@bot.check
+async def leader_only(ctx):
+    """Standby instances silently ignore commands so users don't get two replies."""
+    return is_leader()
+
 # ---------------------------------------------------------------------------
 # Bot events
 # ---------------------------------------------------------------------------
 
 @bot.event
 async def on_ready():
-    global _health_server_started
+    global _health_server_started, _event_flush_task, _lease_task, _app_commands_synced
 
-    logger.info(f'Bot logged in as {bot.user}')
+    logger.info("Bot logged in as %s", bot.user)
     await bot.change_presence(status=discord.Status.online)
 
     init_database()
 
     target_guild = bot.get_guild(GUILD_ID)
     if target_guild:
-        logger.info(f'Connected to guild: {target_guild.name}')
+        logger.info("Connected to guild: %s", target_guild.name)
     else:
-        logger.error(f'Could not find guild with ID: {GUILD_ID}')
+        logger.error("Could not find guild with ID: %s", GUILD_ID)
+
+    # Register slash commands on the guild once per process (guild sync is immediate)
+    if not _app_commands_synced and target_guild:
+        try:
+            guild_obj = discord.Object(id=GUILD_ID)
+            bot.tree.copy_global_to(guild=guild_obj)
+            synced = await bot.tree.sync(guild=guild_obj)
+            _app_commands_synced = True
+            logger.info("Synced %s slash commands", len(synced))
+        except discord.HTTPException as e:
+            logger.error("Error syncing slash commands: %s", e)
 
     # Start health check server only once (on_ready fires on every reconnect)
     if not _health_server_started:
         await start_health_server()
         _health_server_started = True
 
-    # Restore scheduled tasks from database for curfews that haven't expired
-    await restore_curfews_from_db()
+    if _event_flush_task is None:
+        _event_flush_task = asyncio.create_task(event_flush_loop())
 
+    open_recorder()
 
-async def restore_curfews_from_db():
-    """Re-schedule kick tasks for curfews persisted in the database."""
-    curfews = get_all_curfews()
-    now = datetime.now(PACIFIC_TZ)
+    if HA_ENABLED and _lease_task is None:
+        # The lease loop restores curfews once this instance becomes leader
+        logger.info("HA enabled, instance %s competing for leader lease", HA_INSTANCE_ID)
+        _lease_task = asyncio.create_task(lease_loop())
+    elif is_leader():
+        if not HA_ENABLED and _lease_task is None:
+            # Refuse to enforce next to a leader elected by HA instances (double kicks)
+            if not await claim_lease_without_ha():
+                await shutdown()
+                return
+            _lease_task = asyncio.create_task(hold_lease_loop())
+        # Restore scheduled tasks from database for curfews that haven't expired
+        await restore_curfews_from_db()
+
+
+def load_curfew_schedule():
+    """Read and parse every persisted curfew into [(user_id, curfew_dt, allow_dt)]."""
+    schedule = []
+    for row in get_all_curfews():
+        try:
+            curfew_dt = parse_stored_time(row['curfew_time'])
+            allow_dt = parse_stored_time(row['allow_time'])
+            schedule.append((row['user_id'], curfew_dt, allow_dt))
+        except (ValueError, TypeError) as e:
+            logger.error("Error parsing curfew for user %s: %s", row['user_id'], e, extra={"user_id": row['user_id']})
+    return schedule
+
+
+async def restore_curfews_from_db(schedule=None):
+    """Re-schedule kick tasks for curfews persisted in the database.
+
+    `schedule` is an already-parsed load_curfew_schedule() result (the HA standby's warm copy).
+    """
+    if schedule is None:
+        schedule = load_curfew_schedule()
+    now = utcnow()
 
     target_guild = bot.get_guild(GUILD_ID)
     if not target_guild:
         return
 
-    for row in curfews:
-        user_id = row['user_id']
-        try:
-            curfew_dt = datetime.fromisoformat(row['curfew_time'])
-            allow_dt = datetime.fromisoformat(row['allow_time'])
-
-            if curfew_dt.tzinfo is None:
-                curfew_dt = PACIFIC_TZ.localize(curfew_dt)
-            if allow_dt.tzinfo is None:
-                allow_dt = PACIFIC_TZ.localize(allow_dt)
+    if get_settings(target_guild.id)['ENFORCEMENT_MODE'] == 'role':
+        await ensure_curfew_role(target_guild)
+    active = set()
 
+    for user_id, curfew_dt, allow_dt in schedule:
+        try:
             # If the allow time has passed, curfew is expired — clean it up
             if now >= allow_dt:
                 remove_user_curfew(user_id)
-                logger.info(f"Cleaned up expired curfew for user {user_id}")
+                logger.info("Cleaned up expired curfew for user %s", user_id, extra={"user_id": user_id, "event": "curfew_expired"})
                 continue
 
+            if now >= curfew_dt:
+                active.add(user_id)
+
             member = target_guild.get_member(user_id)
             if not member:
                 continue
 
             # If curfew is currently active, kick them if they're in voice
             if now >= curfew_dt and now < allow_dt:
+                await hold_curfew_role(member, clock.monotonic() + (allow_dt - now).total_seconds())
                 if member.voice and member.voice.channel:
+                    started = time.monotonic()
                     await member.move_to(None)
-                    logger.info(f"Kicked {member.display_name} from voice on startup (active curfew)")
+                    record_event(member, "kick", (time.monotonic() - started) * 1000)
+                    logger.info("Kicked %s from voice on startup (active curfew)", member.display_name,
+                                extra=log_ctx(member, "kick"))
                 continue
 
             # If curfew time hasn't hit yet, schedule the kick
             if now < curfew_dt:
-                time_diff = (curfew_dt - now).total_seconds()
-                kick_task = asyncio.create_task(kick_after_delay(member, time_diff))
-
-                reminder_delay = max(0, time_diff - 300)
-                reminder_task = None
-                if reminder_delay > 0:
-                    reminder_task = asyncio.create_task(schedule_reminder(member, reminder_delay))
-
-                scheduled_tasks[user_id] = {"kick": kick_task, "reminder": reminder_task}
-                logger.info(f"Restored curfew schedule for {member.display_name}")
-
-        except (ValueError, TypeError) as e:
-            logger.error(f"Error restoring curfew for user {user_id}: {e}")
+                # on_ready fires on every reconnect — don't stack duplicate tasks
+                cancel_user_tasks(user_id)
+                schedule_user_tasks(member, curfew_dt, now)
+                logger.info("Restored curfew schedule for %s", member.display_name, extra=log_ctx(member, "restore"))
+
+        except Exception as e:
+            logger.error("Error restoring curfew for user %s: %s", user_id, e, extra={"user_id": user_id})
+
+    # Roles outlive the process: re-arm the release for curfews still running (the holder
+    # may not be cached) and take back any left over from a curfew that ended while we were down
+    for user_id in curfew_role_holders(target_guild):
+        hold = role_holds.get(user_id)
+        if user_id in active and hold:
+            schedule_role_release(target_guild, user_id, hold["release_at"])
+        elif user_id not in active:
+            await lift_curfew_role(target_guild, user_id)
 
 # ---------------------------------------------------------------------------
 # Commands
 # ---------------------------------------------------------------------------
 
-@bot.command()
+@bot.hybrid_command()
+@app_commands.default_permissions(administrator=True)
 @commands.has_permissions(administrator=True)
+@app_commands.describe(time_str="Curfew time, e.g. 11:30PM", member="Member to put on curfew")
 async def curfew(ctx, time_str: str, member: discord.Member):
     """Set a curfew for a user."""
+    record_gateway("curfew", u=ctx.author.id, m=member.id, n=member.display_name, time=time_str)
     try:
-        if member.id in EXCLUDED_USERS:
-            await ctx.send(f"{member.display_name} is excluded from curfews.")
-            return
-
-        # Parse the time string (supports "11:30PM" and "11:30 PM")
-        parsed_time = None
-        for fmt in ('%I:%M%p', '%I:%M %p'):
-            try:
-                parsed_time = datetime.strptime(time_str, fmt).time()
-                break
-            except ValueError:
-                continue
-
-        if parsed_time is None:
-            await ctx.send("Invalid time format. Please use '11:30PM' or '11:30 PM'.")
-            return
-
-        now = datetime.now(PACIFIC_TZ)
-        curfew_dt = PACIFIC_TZ.localize(datetime.combine(now.date(), parsed_time))
-
-        # If the curfew time already passed today, schedule for tomorrow
-        if curfew_dt <= now:
-            curfew_dt += timedelta(days=1)
-
-        time_diff = (curfew_dt - now).total_seconds()
-
-        # Allow time = 5 minutes after curfew
-        allow_dt = curfew_dt + timedelta(minutes=5)
-
-        # Store full ISO datetimes so midnight-crossing comparisons work
-        curfew_time_str = curfew_dt.isoformat()
-        allow_time_str = allow_dt.isoformat()
+        await ctx.defer()
+        async with user_locks.hold(member.id):
+            if member.id in get_settings(ctx.guild.id)['EXCLUDED_USERS']:
+                await ctx.send(f"{member.display_name} is excluded from curfews.")
+                return
 
-        # Cancel existing tasks and reset appeal state for fresh curfew
-        cancel_user_tasks(member.id)
-        appeal_state.pop(member.id, None)
+            parsed_time = parse_time_str(time_str)
+            if parsed_time is None:
+                await ctx.send("Invalid time format. Please use '11:30PM' or '11:30 PM'.")
+                return
 
-        success = add_or_update_curfew(
-            member.display_name,
-            member.id,
-            curfew_time_str,
-            allow_time_str,
-        )
+            # The time is read in the member's timezone, then stored as UTC
+            tz = resolve_timezone(member.id, ctx.guild.id)
+            now = utcnow()
+            curfew_dt, allow_dt = next_curfew_window(parsed_time, tz, now)
 
-        if not success:
-            await ctx.send("Error setting curfew. Please try again.")
-            return
+            # Cancel existing tasks and reset appeal state for fresh curfew
+            cancel_user_tasks(member.id)
+            appeal_state.pop(member.id, None)
+            await lift_curfew_role(ctx.guild, member.id)
 
-        # Schedule the kick
-        kick_task = asyncio.create_task(kick_after_delay(member, time_diff))
+            # Store full ISO datetimes so midnight-crossing comparisons work
+            success = add_or_update_curfew(
+                member.display_name,
+                member.id,
+                curfew_dt.isoformat(),
+                allow_dt.isoformat(),
+            )
 
-        # Schedule 5-minute reminder
-        reminder_task = None
-        reminder_delay = max(0, time_diff - 300)
-        if reminder_delay > 0:
-            reminder_task = asyncio.create_task(schedule_reminder(member, reminder_delay))
+            if not success:
+                await ctx.send("Error setting curfew. Please try again.")
+                return
 
-        scheduled_tasks[member.id] = {"kick": kick_task, "reminder": reminder_task}
+            schedule_user_tasks(member, curfew_dt, now)
 
-        display_curfew = curfew_dt.strftime('%I:%M %p')
-        display_allow = allow_dt.strftime('%I:%M %p')
-        await ctx.send(
-            f"Curfew set for {member.display_name} at {display_curfew} PST. "
-            f"They can rejoin voice channels at {display_allow}."
-        )
-        logger.info(f"Curfew set for {member.display_name} at {display_curfew}")
+            display_curfew = format_local(curfew_dt, tz)
+            display_allow = format_local(allow_dt, tz)
+            await ctx.send(
+                f"Curfew set for {member.display_name} at {display_curfew}. "
+                f"They can rejoin voice channels at {display_allow}."
+            )
+            logger.info("Curfew set for %s at %s", member.display_name, display_curfew, extra=log_ctx(member, "curfew_set"))
 
     except Exception as e:
-        logger.error(f"Error in curfew command: {e}")
+        logger.error("Error in curfew command: %s", e, extra=log_ctx(member, "curfew_set"))
         await ctx.send("An error occurred while setting the curfew. Please try again.")
 
 
-async def kick_after_delay(member, delay):
-    """Kick user from voice channel after delay."""
+async def kick_after_delay(member, due: float):
+    """Kick user from voice channel once clock.monotonic() reaches `due`."""
     try:
-        await asyncio.sleep(delay)
+        await clock.sleep(due - clock.monotonic())
+        if not is_leader():
+            return  # lease lapsed while sleeping; the new leader enforces this curfew
+        # Latency = how late the scheduler woke (on the active clock) + the API call itself
+        late = clock.monotonic() - due
+        # Role mode: Discord refuses rejoins from here on, the kick only ends the current session.
+        # The allow time is always 5 minutes after the curfew.
+        held = await hold_curfew_role(member, due + 300)
         if member.voice and member.voice.channel:
+            started = time.monotonic()
             await member.move_to(None)
-            logger.info(f"Kicked {member.display_name} from voice channel")
+            record_event(member, "kick", (late + time.monotonic() - started) * 1000)
+            logger.info("Kicked %s from voice channel", member.display_name, extra=log_ctx(member, "kick"))
 
-        scheduled_tasks.pop(member.id, None)
+        if not held:
+            scheduled_tasks.pop(member.id, None)
+        scheduled_due.pop(member.id, None)
 
     except asyncio.CancelledError:
         pass
     except Exception as e:
-        logger.error(f"Error kicking {member.display_name}: {e}")
+        logger.error("Error kicking %s: %s", member.display_name, e, extra=log_ctx(member, "kick"))
 
 
-async def schedule_reminder(member, delay):
-    """Send reminder before curfew."""
+async def schedule_reminder(member, due: float):
+    """Send reminder before curfew, once clock.monotonic() reaches `due`."""
     try:
-        await asyncio.sleep(delay)
+        await clock.sleep(due - clock.monotonic())
+        if not is_leader():
+            return
+        late = clock.monotonic() - due
+        started = time.monotonic()
 
-        curfew_channel = discord.utils.get(member.guild.channels, name="curfew")
+        cfg = get_settings(member.guild.id)
+        curfew_channel = discord.utils.get(member.guild.channels, name=cfg['REMINDER_CHANNEL'])
         if not curfew_channel:
-            curfew_channel = discord.utils.get(member.guild.channels, name="general")
+            curfew_channel = discord.utils.get(member.guild.channels, name=cfg['SHAME_CHANNEL'])
 
         if curfew_channel:
             embed = discord.Embed(
@@ -399,27 +2221,28 @@ async def schedule_reminder(member, delay):
                 color=discord.Color.orange(),
             )
             await curfew_channel.send(embed=embed)
-            logger.info(f"Sent curfew reminder to {member.display_name}")
+            record_event(member, "reminder", (late + time.monotonic() - started) * 1000)
+            logger.info("Sent curfew reminder to %s", member.display_name, extra=log_ctx(member, "reminder"))
 
     except asyncio.CancelledError:
         pass
     except Exception as e:
-        logger.error(f"Error sending reminder to {member.display_name}: {e}")
+        logger.error("Error sending reminder to %s: %s", member.display_name, e, extra=log_ctx(member, "reminder"))
 
 
-@bot.command()
+@bot.hybrid_command()
+@app_commands.default_permissions(administrator=True)
 @commands.has_permissions(administrator=True)
 async def reset(ctx):
     """Reset all curfews."""
     try:
-        for tasks in scheduled_tasks.values():
-            for task in tasks.values():
-                if task is not None:
-                    task.cancel()
-        scheduled_tasks.clear()
+        await ctx.defer()
+        cancel_all_tasks()
         appeal_state.clear()
 
         success = clear_all_curfews()
+        for user_id in curfew_role_holders(ctx.guild):
+            await lift_curfew_role(ctx.guild, user_id)
 
         if success:
             await ctx.send("All curfews have been reset.")
@@ -428,201 +2251,625 @@ async def reset(ctx):
             await ctx.send("Error resetting curfews. Please try again.")
 
     except Exception as e:
-        logger.error(f"Error in reset command: {e}")
+        logger.error("Error in reset command: %s", e, extra={"guild_id": ctx.guild.id, "event": "reset"})
         await ctx.send("An error occurred while resetting curfews.")
 
 
-@bot.command()
+LIST_PAGE_SIZE = 25  # Discord embeds cap at 25 fields
+
+
+def build_curfews_embed(rows, page: int, guild_id: Optional[int] = None) -> discord.Embed:
+    """Render one page of curfew rows as an embed, in each user's timezone."""
+    embed = discord.Embed(title="Active Curfews", color=discord.Color.blue())
+
+    for row in rows:
+        user_name = row['user_name']
+        try:
+            tz = resolve_timezone(row['user_id'], guild_id)
+            curfew_display = format_local(parse_stored_time(row['curfew_time']), tz)
+            allow_display = format_local(parse_stored_time(row['allow_time']), tz)
+        except (ValueError, TypeError):
+            curfew_display = row['curfew_time']
+            allow_display = row['allow_time']
+
+        embed.add_field(
+            name=user_name,
+            value=f"Curfew: {curfew_display}\nAllow: {allow_display}",
+            inline=True,
+        )
+
+    embed.set_footer(text=f"Page {page + 1}")
+    return embed
+
+
+class CurfewPager(discord.ui.View):
+    """Previous/Next buttons for list_curfews. Each page is fetched lazily with a keyset cursor."""
+
+    def __init__(self, author_id: int, first_page, guild_id: Optional[int] = None):
+        super().__init__(timeout=180)
+        self.author_id = author_id
+        self.guild_id = guild_id
+        self.rows = first_page[:LIST_PAGE_SIZE]
+        self.has_next = len(first_page) > LIST_PAGE_SIZE
+        # Cursor that each visited page started after; cursors[0] is None (first page)
+        self.cursors = [None]
+        self.message = None
+        self._update_buttons()
+
+    @property
+    def page(self) -> int:
+        return len(self.cursors) - 1
+
+    def _update_buttons(self):
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = not self.has_next
+
+    async def _show(self, interaction: discord.Interaction, after: Optional[tuple]):
+        rows = get_curfews_page(after, LIST_PAGE_SIZE + 1)
+        self.rows = rows[:LIST_PAGE_SIZE]
+        self.has_next = len(rows) > LIST_PAGE_SIZE
+        self._update_buttons()
+        await interaction.response.edit_message(embed=build_curfews_embed(self.rows, self.page, self.guild_id), view=self)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("Only the admin who ran this command can page through it.", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.cursors.pop()
+        await self._show(interaction, self.cursors[-1])
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.primary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        last = self.rows[-1]
+        after = (last['curfew_time'], last['user_id'])
+        self.cursors.append(after)
+        await self._show(interaction, after)
+
+    async def on_timeout(self):
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
+
+@bot.hybrid_command()
+@app_commands.default_permissions(administrator=True)
 @commands.has_permissions(administrator=True)
 async def list_curfews(ctx):
-    """List all active curfews."""
+    """List all active curfews, 25 per page."""
     try:
-        curfews = get_all_curfews()
+        await ctx.defer()
+        first_page = get_curfews_page(None, LIST_PAGE_SIZE + 1)
 
-        if not curfews:
+        if not first_page:
             await ctx.send("No active curfews.")
             return
 
-        embed = discord.Embed(title="Active Curfews", color=discord.Color.blue())
-
-        for row in curfews:
-            user_name = row['user_name']
-            try:
-                curfew_dt = datetime.fromisoformat(row['curfew_time'])
-                allow_dt = datetime.fromisoformat(row['allow_time'])
-                curfew_display = curfew_dt.strftime('%I:%M %p')
-                allow_display = allow_dt.strftime('%I:%M %p')
-            except (ValueError, TypeError):
-                curfew_display = row['curfew_time']
-                allow_display = row['allow_time']
-
-            embed.add_field(
-                name=user_name,
-                value=f"Curfew: {curfew_display}\nAllow: {allow_display}",
-                inline=True,
-            )
-
-        await ctx.send(embed=embed)
+        view = CurfewPager(ctx.author.id, first_page, ctx.guild.id)
+        embed = build_curfews_embed(view.rows, 0, ctx.guild.id)
+        if view.has_next:
+            view.message = await ctx.send(embed=embed, view=view)
+        else:
+            await ctx.send(embed=embed)
 
     except Exception as e:
-        logger.error(f"Error in list_curfews command: {e}")
+        logger.error("Error in list_curfews command: %s", e)
         await ctx.send("An error occurred while listing curfews.")
 
 
-@bot.command()
+@bot.hybrid_command()
+@app_commands.default_permissions(administrator=True)
 @commands.has_permissions(administrator=True)
+@app_commands.describe(member="Member whose curfew to remove")
 async def remove_curfew(ctx, member: discord.Member):
     """Remove a specific user's curfew."""
     try:
-        cancel_user_tasks(member.id)
-        appeal_state.pop(member.id, None)
-
-        success = remove_user_curfew(member.id)
+        async with user_locks.hold(member.id):
+            success = clear_user_curfew(member.id)
+            await lift_curfew_role(ctx.guild, member.id)
 
         if success:
             await ctx.send(f"Curfew removed for {member.display_name}.")
-            logger.info(f"Curfew removed for {member.display_name}")
+            logger.info("Curfew removed for %s", member.display_name, extra=log_ctx(member, "curfew_removed"))
         else:
             await ctx.send(f"No curfew found for {member.display_name}.")
 
     except Exception as e:
-        logger.error(f"Error in remove_curfew command: {e}")
+        logger.error("Error in remove_curfew command: %s", e, extra=log_ctx(member, "curfew_removed"))
         await ctx.send("An error occurred while removing the curfew.")
 
-@bot.command()
+
+@bot.hybrid_command(name="timezone")
 @commands.guild_only()
-async def appeal(ctx, *, reason: str = "No reason given"):
-    """Appeal your curfew for a time extension. Usage: !appeal <reason>"""
+@app_commands.describe(tz_name="IANA timezone like America/New_York, or 'reset'")
+async def timezone_cmd(ctx, tz_name: Optional[str] = None):
+    """Show or set your timezone. Usage: !timezone [America/New_York | reset]"""
     try:
-        member = ctx.author
-        curfew_info = get_user_curfew(member.id)
+        if tz_name is None:
+            tz = resolve_timezone(ctx.author.id, ctx.guild.id)
+            await ctx.send(f"Your curfew times are shown in {tz.key}.")
+            return
 
-        if not curfew_info:
-            await ctx.send("You don't have an active curfew to appeal.")
+        if tz_name.lower() == "reset":
+            if not set_user_timezone(ctx.author.id, None):
+                await ctx.send("Error saving your timezone. Please try again.")
+                return
+            user_timezones.pop(ctx.author.id, None)
+            await ctx.send(f"Timezone reset to the server default ({resolve_timezone(ctx.author.id, ctx.guild.id).key}).")
             return
 
-        now = datetime.now(PACIFIC_TZ)
+        zone = parse_timezone(tz_name)
+        if zone is None:
+            await ctx.send("Unknown timezone. Use an IANA name like 'America/New_York' or 'Europe/London'.")
+            return
 
-        try:
-            curfew_dt = datetime.fromisoformat(curfew_info['curfew_time'])
-            if curfew_dt.tzinfo is None:
-                curfew_dt = PACIFIC_TZ.localize(curfew_dt)
-        except (ValueError, TypeError) as e:
-            logger.error(f"Error parsing curfew times for appeal: {e}")
-            await ctx.send("Error reading your curfew data. Please contact an admin.")
+        if not set_user_timezone(ctx.author.id, zone.key):
+            await ctx.send("Error saving your timezone. Please try again.")
             return
+        user_timezones[ctx.author.id] = zone
+        await ctx.send(f"Your timezone is now {zone.key}. Existing curfews keep their time; new ones use this zone.")
+        logger.info("Timezone for %s set to %s", ctx.author.display_name, zone.key, extra=log_ctx(ctx.author, "timezone"))
 
-        # Check if curfew has already started
-        if now >= curfew_dt:
-            await ctx.send("Too late to appeal — your curfew has already started.")
+    except Exception as e:
+        logger.error("Error in timezone command: %s", e, extra=log_ctx(ctx.author, "timezone"))
+        await ctx.send("An error occurred while setting your timezone.")
+
+
+@bot.hybrid_command()
+@app_commands.default_permissions(administrator=True)
+@commands.has_permissions(administrator=True)
+@app_commands.describe(tz_name="IANA timezone like America/Chicago")
+async def server_timezone(ctx, tz_name: str):
+    """Set the server's default timezone. Usage: !server_timezone America/Chicago"""
+    try:
+        zone = parse_timezone(tz_name)
+        if zone is None:
+            await ctx.send("Unknown timezone. Use an IANA name like 'America/New_York' or 'Europe/London'.")
             return
 
-        # Check if within the appeal window (15 minutes before curfew)
-        window_open = curfew_dt - timedelta(minutes=APPEAL_WINDOW_MINUTES)
-        if now < window_open:
-            minutes_until_window = int((window_open - now).total_seconds() / 60) + 1
-            await ctx.send(
-                f"Appeals open {APPEAL_WINDOW_MINUTES} minutes before your curfew. "
-                f"Try again in ~{minutes_until_window} minutes."
-            )
+        if not set_guild_timezone(ctx.guild.id, zone.key):
+            await ctx.send("Error saving the server timezone. Please try again.")
             return
+        guild_timezones[ctx.guild.id] = zone
+        await ctx.send(f"Server timezone is now {zone.key}.")
+        logger.info("Server timezone for %s set to %s", ctx.guild.name, zone.key, extra={"guild_id": ctx.guild.id, "event": "timezone"})
+
+    except Exception as e:
+        logger.error("Error in server_timezone command: %s", e, extra={"guild_id": ctx.guild.id, "event": "timezone"})
+        await ctx.send("An error occurred while setting the server timezone.")
+
+@bot.hybrid_command()
+@commands.guild_only()
+@app_commands.describe(member="Show this member's stats instead of the leaderboard")
+async def stats(ctx, member: Optional[discord.Member] = None):
+    """Show curfew stats for a user, or the server leaderboard. Usage: !stats [@user]"""
+    try:
+        await ctx.defer()
+        await flush_events()
+
+        if member:
+            data = stats_row_to_dict(await asyncio.to_thread(get_user_stats, member.id, ctx.guild.id))
+            embed = discord.Embed(title=f"Curfew Stats: {member.display_name}", color=discord.Color.blue())
+        else:
+            today = utcnow().astimezone(guild_timezones.get(ctx.guild.id, DEFAULT_TZ)).date().isoformat()
+            totals, today_row, top_rows = await asyncio.to_thread(get_guild_stats, ctx.guild.id, today)
+            data = stats_row_to_dict(totals)
+            embed = discord.Embed(title="Curfew Leaderboard", color=discord.Color.blue())
+
+        embed.add_field(name="Kicks", value=str(data["kicks"]), inline=True)
+        embed.add_field(name="Shames", value=str(data["shames"]), inline=True)
+        win_rate = data["appeal_win_rate"]
+        embed.add_field(
+            name="Appeals Won",
+            value=f"{data['appeals_granted']}/{data['appeals']}" + (f" ({win_rate:.0%})" if win_rate is not None else ""),
+            inline=True,
+        )
+        if data["avg_appeal_minutes_before_curfew"] is not None:
+            embed.add_field(
+                name="Avg Appeal Lead",
+                value=f"{data['avg_appeal_minutes_before_curfew']} min before curfew",
+                inline=True,
+            )
+
+        if not member:
+            today_data = stats_row_to_dict(today_row)
+            embed.add_field(name="Kicks Today", value=str(today_data["kicks"]), inline=True)
+            if top_rows:
+                lines = []
+                for rank, row in enumerate(top_rows, start=1):
+                    top_member = ctx.guild.get_member(row['user_id'])
+                    name = top_member.display_name if top_member else str(row['user_id'])
+                    lines.append(f"{rank}. {name} — {row['kicks']} kicks")
+                embed.add_field(name="Most Kicked", value="\n".join(lines), inline=False)
+
+        await ctx.send(embed=embed)
+
+    except Exception as e:
+        logger.error("Error in stats command: %s", e, extra=log_ctx(member or ctx.author, "stats"))
+        await ctx.send("An error occurred while loading stats.")
+
+
+@bot.hybrid_command()
+@app_commands.default_permissions(administrator=True)
+@commands.has_permissions(administrator=True)
+async def export_state(ctx):
+    """Export curfews, appeal and shame state and pending schedules as a snapshot file."""
+    try:
+        await ctx.defer()
+        records = await asyncio.to_thread(write_snapshot, SNAPSHOT_PATH, capture_memory_state())
+        await ctx.send(
+            f"State snapshot written ({records} records). Attach it to `!import_state` on the new host.",
+            file=discord.File(SNAPSHOT_PATH, filename="curfew_state.ndjson.gz"),
+        )
+        logger.info("State snapshot exported (%s records)", records)
+
+    except Exception as e:
+        logger.error("Error in export_state command: %s", e)
+        await ctx.send("An error occurred while exporting state.")
+
 
-        # Get or create appeal state for this user
-        state = appeal_state.setdefault(member.id, {"count": 0, "last_attempt": None})
+@bot.hybrid_command()
+@app_commands.default_permissions(administrator=True)
+@commands.has_permissions(administrator=True)
+@app_commands.describe(snapshot="File from export_state (defaults to the last export in DB_DIR)")
+async def import_state(ctx, snapshot: Optional[discord.Attachment] = None):
+    """Import a state snapshot from an attachment (or the last export in DB_DIR)."""
+    try:
+        await ctx.defer()
+        path = SNAPSHOT_PATH
+        if snapshot:
+            path = os.path.join(DB_DIR, "state_import.ndjson.gz")
+            await snapshot.save(path)
+        elif not os.path.exists(path):
+            await ctx.send("Attach a snapshot file from `!export_state`.")
+            return
 
-        # Check appeals remaining
-        if state["count"] >= APPEAL_MAX_PER_CURFEW:
-            await ctx.send("You've used all your appeals for this curfew. No more chances.")
+        try:
+            curfew_users, users = await asyncio.to_thread(snapshot_user_ids, path)
+        except (ValueError, OSError, EOFError) as e:
+            await ctx.send(f"Could not import snapshot: {e}")
             return
 
-        # Check cooldown
-        if state["last_attempt"]:
-            elapsed = (now - state["last_attempt"]).total_seconds()
-            if elapsed < APPEAL_COOLDOWN_SECONDS:
-                remaining = int(APPEAL_COOLDOWN_SECONDS - elapsed)
-                await ctx.send(f"Slow down! You can appeal again in {remaining} seconds.")
+        # The import rewrites curfews and appeal state, so wait out anything in flight for these users
+        async with user_locks.hold_many(users):
+            try:
+                curfews, records = await asyncio.to_thread(read_snapshot, path)
+            except (ValueError, OSError, EOFError) as e:
+                await ctx.send(f"Could not import snapshot: {e}")
                 return
 
-        # Roll the dice
-        granted = random.random() < APPEAL_GRANT_RATE
-        extension_minutes = APPEAL_EXTENSIONS[state["count"]]
+            # Schedules for the old curfews are stale; the snapshot's sched records re-arm the pending ones
+            for user_id in curfew_users:
+                cancel_user_tasks(user_id)
+                appeal_state.pop(user_id, None)
+                await lift_curfew_role(ctx.guild, user_id)
+            restored, skipped = await apply_memory_state(records)
 
-        # Generate AI or static response
-        ai_text = await generate_appeal_response(granted, reason)
-        if ai_text:
-            ruling_text = ai_text
-        else:
+        await ctx.send(
+            f"Imported {curfews} curfews and {len(records)} state records; {restored} schedules re-armed"
+            + (f", {skipped} skipped (member left or kick already due)." if skipped else ".")
+        )
+        logger.info("State snapshot imported: %s curfews, %s schedules, %s skipped", curfews, restored, skipped)
+
+    except Exception as e:
+        logger.error("Error in import_state command: %s", e)
+        await ctx.send("An error occurred while importing state.")
+
+
+@bot.hybrid_command()
+@app_commands.default_permissions(administrator=True)
+@commands.has_permissions(administrator=True)
+@app_commands.describe(days="How many days of history to export")
+async def export_events(ctx, days: int = 7):
+    """Export the last N days of enforcement events as a gzipped CSV."""
+    try:
+        await ctx.defer()
+        await flush_events()
+        since = time.time() - days * 86400
+        data = await asyncio.to_thread(export_events_csv_gz, since)
+        await ctx.send(
+            f"Enforcement events for the last {days} days:",
+            file=discord.File(io.BytesIO(data), filename="curfew_events.csv.gz"),
+        )
+
+    except Exception as e:
+        logger.error("Error in export_events command: %s", e)
+        await ctx.send("An error occurred while exporting events.")
+
+
+@bot.hybrid_command()
+@commands.guild_only()
+@app_commands.describe(reason="Why you deserve more time")
+async def appeal(ctx, *, reason: str = "No reason given"):
+    """Appeal your curfew for a time extension. Usage: !appeal <reason>"""
+    record_gateway("appeal", u=ctx.author.id, n=ctx.author.display_name, reason=reason)
+    try:
+        await ctx.defer()
+        # One appeal per user at a time: the cooldown check through the state commit runs under the lock
+        async with user_locks.hold(ctx.author.id):
+            started = time.monotonic()
+            member = ctx.author
+            cfg = get_settings(ctx.guild.id)
+            curfew_info = get_user_curfew(member.id)
+
+            if not curfew_info:
+                await ctx.send("You don't have an active curfew to appeal.")
+                return
+
+            now = utcnow()
+
+            try:
+                curfew_dt = parse_stored_time(curfew_info['curfew_time'])
+            except (ValueError, TypeError) as e:
+                logger.error("Error parsing curfew times for appeal: %s", e, extra=log_ctx(ctx.author, "appeal"))
+                await ctx.send("Error reading your curfew data. Please contact an admin.")
+                return
+
+            # Check if curfew has already started
+            if now >= curfew_dt:
+                await ctx.send("Too late to appeal — your curfew has already started.")
+                return
+
+            lead_minutes = (curfew_dt - now).total_seconds() / 60
+
+            # Check if within the appeal window (15 minutes before curfew)
+            window_open = curfew_dt - timedelta(minutes=cfg['APPEAL_WINDOW_MINUTES'])
+            if now < window_open:
+                minutes_until_window = int((window_open - now).total_seconds() / 60) + 1
+                await ctx.send(
+                    f"Appeals open {cfg['APPEAL_WINDOW_MINUTES']} minutes before your curfew. "
+                    f"Try again in ~{minutes_until_window} minutes."
+                )
+                return
+
+            # Get or create appeal state for this user
+            state = appeal_state.setdefault(member.id, {"count": 0, "last_attempt": None})
+
+            # Check appeals remaining
+            if state["count"] >= cfg['APPEAL_MAX_PER_CURFEW']:
+                await ctx.send("You've used all your appeals for this curfew. No more chances.")
+                return
+
+            # Check cooldown
+            if state["last_attempt"]:
+                elapsed = (now - state["last_attempt"]).total_seconds()
+                if elapsed < cfg['APPEAL_COOLDOWN_SECONDS']:
+                    remaining = int(cfg['APPEAL_COOLDOWN_SECONDS'] - elapsed)
+                    await ctx.send(f"Slow down! You can appeal again in {remaining} seconds.")
+                    return
+
+            # Roll the dice
+            granted = random.random() < cfg['APPEAL_GRANT_RATE']
+            extension_minutes = cfg['APPEAL_EXTENSIONS'][state["count"]]
+
+            # Static ruling goes out immediately; the AI ruling is edited in if it arrives in time
             if granted:
                 ruling_text = random.choice(APPEAL_GRANT_MESSAGES)
             else:
                 ruling_text = random.choice(APPEAL_DENY_MESSAGES)
 
-        # Preview appeals remaining (state not yet committed)
-        appeals_left = APPEAL_MAX_PER_CURFEW - state["count"] - 1
+            # Preview appeals remaining (state not yet committed)
+            appeals_left = cfg['APPEAL_MAX_PER_CURFEW'] - state["count"] - 1
 
-        if granted:
-            # Extend the curfew
-            new_curfew_dt = curfew_dt + timedelta(minutes=extension_minutes)
-            new_allow_dt = new_curfew_dt + timedelta(minutes=5)
+            if granted:
+                # Extend the curfew
+                new_curfew_dt = curfew_dt + timedelta(minutes=extension_minutes)
+                new_allow_dt = new_curfew_dt + timedelta(minutes=5)
+
+                # Cancel old tasks and reschedule
+                cancel_user_tasks(member.id)
+
+                success = add_or_update_curfew(
+                    member.display_name,
+                    member.id,
+                    new_curfew_dt.isoformat(),
+                    new_allow_dt.isoformat(),
+                )
 
-            # Cancel old tasks and reschedule
-            cancel_user_tasks(member.id)
+                if not success:
+                    await ctx.send("Your appeal was granted but the curfew update failed. Please contact an admin.")
+                    return
 
-            success = add_or_update_curfew(
-                member.display_name,
-                member.id,
-                new_curfew_dt.isoformat(),
-                new_allow_dt.isoformat(),
-            )
+                # Commit state only after DB success
+                state["count"] += 1
+                state["last_attempt"] = now
 
-            if not success:
-                await ctx.send("Your appeal was granted but the curfew update failed. Please contact an admin.")
-                return
+                # Schedule new kick and reminder
+                schedule_user_tasks(member, new_curfew_dt, now)
 
-            # Commit state only after DB success
-            state["count"] += 1
-            state["last_attempt"] = now
+                embed = discord.Embed(
+                    title="Appeal GRANTED",
+                    description=ruling_text,
+                    color=discord.Color.green(),
+                )
+                embed.add_field(name="Extension", value=f"+{extension_minutes} minutes", inline=True)
+                embed.add_field(name="New Curfew", value=format_local(new_curfew_dt, resolve_timezone(member.id, ctx.guild.id)), inline=True)
+                embed.add_field(name="Appeals Left", value=str(appeals_left), inline=True)
+                message = await ctx.send(embed=embed)
+                record_event(member, "appeal_granted", (time.monotonic() - started) * 1000, lead_minutes)
+                upgrade_with_ai(message, embed, lambda: generate_appeal_response(granted, reason))
+                logger.info("Appeal granted for %s: +%dmin", member.display_name, extension_minutes,
+                            extra=log_ctx(member, "appeal_granted"))
 
-            # Schedule new kick and reminder
-            time_diff = (new_curfew_dt - now).total_seconds()
-            kick_task = asyncio.create_task(kick_after_delay(member, time_diff))
+            else:
+                # Commit state for denial
+                state["count"] += 1
+                state["last_attempt"] = now
+
+                embed = discord.Embed(
+                    title="Appeal DENIED",
+                    description=ruling_text,
+                    color=discord.Color.red(),
+                )
+                embed.add_field(name="Curfew", value=format_local(curfew_dt, resolve_timezone(member.id, ctx.guild.id)) + " (unchanged)", inline=True)
+                embed.add_field(name="Appeals Left", value=str(appeals_left), inline=True)
+                message = await ctx.send(embed=embed)
+                record_event(member, "appeal_denied", (time.monotonic() - started) * 1000, lead_minutes)
+                upgrade_with_ai(message, embed, lambda: generate_appeal_response(granted, reason))
+                logger.info("Appeal denied for %s", member.display_name, extra=log_ctx(member, "appeal_denied"))
 
-            reminder_task = None
-            reminder_delay = max(0, time_diff - 300)
-            if reminder_delay > 0:
-                reminder_task = asyncio.create_task(schedule_reminder(member, reminder_delay))
+    except Exception as e:
+        logger.error("Error in appeal command: %s", e, extra=log_ctx(ctx.author, "appeal"))
+        await ctx.send("An error occurred while processing your appeal.")
 
-            scheduled_tasks[member.id] = {"kick": kick_task, "reminder": reminder_task}
+# ---------------------------------------------------------------------------
+# Curfew role enforcement
+# ---------------------------------------------------------------------------
+# With ENFORCEMENT_MODE=role a curfewed member also gets CURFEW_ROLE, which every
+# voice channel denies Connect, so Discord itself refuses rejoins until the role
+# is removed at allow time. Kick-on-join stays as the fallback for anything the
+# overwrites don't cover (e.g. another role with an explicit Connect allow).
 
-            embed = discord.Embed(
-                title="Appeal GRANTED",
-                description=ruling_text,
-                color=discord.Color.green(),
-            )
-            embed.add_field(name="Extension", value=f"+{extension_minutes} minutes", inline=True)
-            embed.add_field(name="New Curfew", value=new_curfew_dt.strftime('%I:%M %p'), inline=True)
-            embed.add_field(name="Appeals Left", value=str(appeals_left), inline=True)
-            await ctx.send(embed=embed)
-            logger.info(f"Appeal granted for {member.display_name}: +{extension_minutes}min")
+_role_setup_lock = asyncio.Lock()
 
-        else:
-            # Commit state for denial
-            state["count"] += 1
-            state["last_attempt"] = now
 
-            embed = discord.Embed(
-                title="Appeal DENIED",
-                description=ruling_text,
-                color=discord.Color.red(),
-            )
-            embed.add_field(name="Curfew", value=curfew_dt.strftime('%I:%M %p') + " (unchanged)", inline=True)
-            embed.add_field(name="Appeals Left", value=str(appeals_left), inline=True)
-            await ctx.send(embed=embed)
-            logger.info(f"Appeal denied for {member.display_name}")
+def find_curfew_role(guild):
+    """The guild's bot-managed curfew role, if any (no API calls).
+
+    Tracked by ID, so renaming it in Discord is fine. Outside role mode a role is
+    never picked up by name: the server may have its own role called CURFEW_ROLE.
+    """
+    role_id = managed_roles.get(guild.id)
+    role = discord.utils.get(guild.roles, id=role_id) if role_id else None
+    if role is None and get_settings(guild.id)['ENFORCEMENT_MODE'] == 'role':
+        role = discord.utils.get(guild.roles, name=get_settings(guild.id)['CURFEW_ROLE'])
+    return role
+
+
+async def deny_connect(channel, role):
+    """Give `role` a Connect deny on a voice channel unless it already has one."""
+    overwrite = channel.overwrites_for(role)
+    if overwrite.connect is not False:
+        overwrite.connect = False
+        await channel.set_permissions(role, overwrite=overwrite, reason="Curfewed members cannot join voice")
+
+
+async def ensure_curfew_role(guild):
+    """Find or create the curfew role and deny it Connect on every voice channel. None on failure."""
+    async with _role_setup_lock:
+        role = find_curfew_role(guild)
+        try:
+            if role is None:
+                role = await guild.create_role(
+                    name=get_settings(guild.id)['CURFEW_ROLE'],
+                    permissions=discord.Permissions.none(),
+                    reason="Curfew enforcement role",
+                )
+                logger.info("Created curfew role '%s' in %s", role.name, guild.name, extra={"guild_id": guild.id, "event": "role_setup"})
+            if managed_roles.get(guild.id) != role.id:
+                # Created just now, or an existing role named CURFEW_ROLE adopted in role mode
+                set_managed_role(guild.id, role.id)
+            for channel in itertools.chain(guild.voice_channels, guild.stage_channels):
+                await deny_connect(channel, role)
+        except discord.HTTPException as e:
+            logger.error("Could not set up the curfew role in %s: %s", guild.name, e, extra={"guild_id": guild.id, "event": "role_setup"})
+        return role
+
+
+async def hold_curfew_role(member, release_due: float) -> bool:
+    """Role mode: give the member the curfew role until clock.monotonic() reaches release_due.
+
+    Returns False (callers fall back to kicking only) outside role mode or if the role can't be applied.
+    """
+    if get_settings(member.guild.id)['ENFORCEMENT_MODE'] != 'role':
+        return False
+    role = await ensure_curfew_role(member.guild)
+    if role is None:
+        return False
+    # Recorded before add_roles, so a call that times out after applying the role still gets cleaned up
+    release_at = utcnow() + timedelta(seconds=max(0.0, release_due - clock.monotonic()))
+    set_role_hold(member.id, member.guild.id, role.id, release_at)
+    try:
+        if role not in member.roles:
+            await member.add_roles(role, reason="Curfew started")
+            logger.info("Curfew role given to %s", member.display_name, extra=log_ctx(member, "role_added"))
+    except discord.HTTPException as e:
+        logger.error("Error giving curfew role to %s: %s", member.display_name, e, extra=log_ctx(member, "role_added"))
+        return False
+
+    schedule_role_release(member.guild, member.id, release_at)
+    return True
+
+
+def curfew_role_holders(guild) -> set:
+    """User IDs that may hold the curfew role: the recorded holds plus any cached member with it."""
+    holders = {user_id for user_id, hold in role_holds.items() if hold["guild_id"] == guild.id}
+    role = find_curfew_role(guild)
+    if role:
+        holders.update(member.id for member in role.members)
+    return holders
+
 
+def schedule_role_release(guild, user_id: int, release_at: datetime):
+    """Arm the task that lifts a member's curfew role at release_at, unless one is already armed."""
+    if "release" not in scheduled_tasks.get(user_id, {}):
+        due = clock.monotonic() + (release_at - utcnow()).total_seconds()
+        task = asyncio.create_task(release_role_after_delay(guild, user_id, due))
+        scheduled_tasks[user_id] = {"release": task}
+
+
+async def lift_curfew_role(guild, user_id: int):
+    """Remove the curfew role from a user by ID. Safe to call in any mode.
+
+    Needs no cached member: the role holders the bot recorded are lifted through the
+    API directly, and a cached member who has the role without a record is too.
+    """
+    hold = role_holds.get(user_id)
+    if hold is None:
+        role = find_curfew_role(guild)
+        member = guild.get_member(user_id)
+        if role is None or member is None or role not in member.roles:
+            return
+        role_id = role.id
+    else:
+        role_id = hold["role_id"]
+
+    extra = {"user_id": user_id, "guild_id": guild.id, "event": "role_removed"}
+    try:
+        await bot.http.remove_role(guild.id, user_id, role_id, reason="Curfew over")
+        logger.info("Curfew role removed from user %s", user_id, extra=extra)
+    except discord.NotFound:
+        pass  # member left or the role was deleted; nothing left to lift
+    except discord.HTTPException as e:
+        # The hold stays recorded, so the next startup cleanup retries
+        logger.error("Error removing curfew role from user %s: %s", user_id, e, extra=extra)
+        return
+    remove_role_hold(user_id)
+
+
+async def release_role_after_delay(guild, user_id: int, due: float):
+    """Remove the curfew role once clock.monotonic() reaches `due` (the allow time)."""
+    try:
+        await clock.sleep(due - clock.monotonic())
+        if not is_leader():
+            return
+        await lift_curfew_role(guild, user_id)
+        scheduled_tasks.pop(user_id, None)
+    except asyncio.CancelledError:
+        pass
     except Exception as e:
-        logger.error(f"Error in appeal command: {e}")
-        await ctx.send("An error occurred while processing your appeal.")
+        logger.error("Error releasing curfew role for user %s: %s", user_id, e,
+                     extra={"user_id": user_id, "guild_id": guild.id, "event": "role_removed"})
+
+
+@bot.event
+async def on_guild_channel_create(channel):
+    """Role mode: new voice channels deny the curfew role Connect too."""
+    if not isinstance(channel, (discord.VoiceChannel, discord.StageChannel)) or not is_leader():
+        return
+    if get_settings(channel.guild.id)['ENFORCEMENT_MODE'] != 'role':
+        return
+    role = find_curfew_role(channel.guild)
+    if role:
+        try:
+            await deny_connect(channel, role)
+        except discord.HTTPException as e:
+            logger.error("Could not deny the curfew role on %s: %s", channel.name, e, extra={"guild_id": channel.guild.id, "event": "role_setup"})
 
 # ---------------------------------------------------------------------------
 # Voice state enforcement
@@ -631,40 +2878,49 @@ async def appeal(ctx, *, reason: str = "No reason given"):
 @bot.event
 async def on_voice_state_update(member, before, after):
     """Enforce curfews when users join voice channels."""
+    record_gateway(
+        "v", u=member.id, n=member.display_name,
+        b=before.channel.id if before.channel else None,
+        a=after.channel.id if after.channel else None,
+    )
     try:
         # Only process if user joined a voice channel
         if not (after.channel and after.channel != before.channel):
             return
 
+        if not is_leader():
+            return
+
         curfew_info = get_user_curfew(member.id)
         if not curfew_info:
             return
 
-        now = datetime.now(PACIFIC_TZ)
+        now = utcnow()
 
         try:
-            # Parse full ISO datetimes — handles midnight crossing correctly
-            curfew_dt = datetime.fromisoformat(curfew_info['curfew_time'])
-            allow_dt = datetime.fromisoformat(curfew_info['allow_time'])
-            if curfew_dt.tzinfo is None:
-                curfew_dt = PACIFIC_TZ.localize(curfew_dt)
-            if allow_dt.tzinfo is None:
-                allow_dt = PACIFIC_TZ.localize(allow_dt)
+            # Stored values are UTC instants — compare directly, no timezone work here
+            curfew_dt = parse_stored_time(curfew_info['curfew_time'])
+            allow_dt = parse_stored_time(curfew_info['allow_time'])
 
             # Only enforce if curfew has started but allow time hasn't passed
             if now >= curfew_dt and now < allow_dt:
+                # Fallback path: in role mode they only get here if the role or its overwrites are missing
+                started = time.monotonic()
                 await member.move_to(None)
-                await send_shame_message(member, curfew_dt.strftime('%I:%M %p'))
-                logger.info(f"Kicked {member.display_name} for violating curfew")
+                record_event(member, "kick", (time.monotonic() - started) * 1000)
+                await hold_curfew_role(member, clock.monotonic() + (allow_dt - now).total_seconds())
+                await send_shame_message(member, format_local(curfew_dt, resolve_timezone(member.id, member.guild.id)))
+                logger.info("Kicked %s for violating curfew", member.display_name, extra=log_ctx(member, "kick"))
             else:
                 remove_user_curfew(member.id)
-                logger.info(f"Curfew expired for {member.display_name}, removed from database")
+                logger.info("Curfew expired for %s, removed from database", member.display_name,
+                            extra=log_ctx(member, "curfew_expired"))
 
         except (ValueError, TypeError) as e:
-            logger.error(f"Error parsing allow time for {member.display_name}: {e}")
+            logger.error("Error parsing allow time for %s: %s", member.display_name, e, extra=log_ctx(member, "voice"))
 
     except Exception as e:
-        logger.error(f"Error in voice state update for {member.display_name}: {e}")
+        logger.error("Error in voice state update for %s: %s", member.display_name, e, extra=log_ctx(member, "voice"))
 
 
 def sanitize_for_prompt(text: str, max_length: int = 32, fallback: str = "Unknown User") -> str:
@@ -727,13 +2983,14 @@ async def generate_shame_message(display_name: str, curfew_time: Optional[str] =
     if not ai_client:
         return None
 
-    today = datetime.now(PACIFIC_TZ).date()
+    cfg = get_settings()
+    today = utcnow().astimezone(DEFAULT_TZ).date()
     if ai_call_date != today:
         ai_call_count = 0
         ai_call_date = today
 
-    if ai_call_count >= AI_DAILY_LIMIT:
-        logger.info("AI daily limit reached, falling back to static message")
+    if ai_call_count >= cfg['AI_DAILY_LIMIT']:
+        logger.info("AI daily limit reached, falling back to static message", extra={"event": "shame"})
         return None
 
     ai_call_count += 1
@@ -743,7 +3000,7 @@ async def generate_shame_message(display_name: str, curfew_time: Optional[str] =
         time_context = f" Their curfew was at {curfew_time}." if curfew_time else ""
         response = await asyncio.wait_for(
             ai_client.messages.create(
-                model=AI_MODEL,
+                model=cfg['AI_MODEL'],
                 max_tokens=150,
                 system=SHAME_SYSTEM_PROMPT,
                 messages=[{
@@ -751,7 +3008,7 @@ async def generate_shame_message(display_name: str, curfew_time: Optional[str] =
                     "content": f"The user's name is {safe_name}.{time_context}",
                 }],
             ),
-            timeout=3.0,
+            timeout=cfg['AI_EDIT_DEADLINE'],
         )
         if not response.content:
             logger.warning("AI returned empty content list")
@@ -760,30 +3017,138 @@ async def generate_shame_message(display_name: str, curfew_time: Optional[str] =
         return text if text else None
 
     except asyncio.TimeoutError:
-        logger.warning("AI shame message timed out, falling back to static")
+        logger.warning("AI shame message missed the edit deadline, keeping static text")
         return None
     except Exception as e:
-        logger.error(f"Error generating AI shame message: {e}")
+        logger.error("Error generating AI shame message: %s", e, extra={"event": "shame"})
         return None
 
 
+class RulingCache:
+    """Bounded LRU/TTL cache of AI appeal rulings keyed on (outcome, normalized reason).
+
+    Each key collects up to `variants` different rulings, then rotates through
+    them, so a repeated reason stops costing API calls without every reply being
+    identical. Concurrent misses for one key share a single request.
+    """
+
+    def __init__(self, max_keys: int, ttl: float, variants: int):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.variants = variants
+        self._entries = OrderedDict()  # {key: {"rulings": [str], "expires": float, "next": int}}
+        self._in_flight = {}           # {key: Task}
+        self.lookups = 0
+        self.hits = 0
+        self.shared = 0
+        self.misses = 0
+        self.calls = 0  # counted by the fetch itself, since a miss may hit the daily limit instead
+
+    def _entry(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires"] <= clock.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _rotate(self, entry) -> str:
+        text = entry["rulings"][entry["next"] % len(entry["rulings"])]
+        entry["next"] += 1
+        return text
+
+    def _finish(self, key, task):
+        self._in_flight.pop(key, None)
+        if task.cancelled() or task.exception() is not None or not task.result():
+            return
+        entry = self._entry(key)
+        if entry is None:
+            entry = self._entries[key] = {"rulings": [], "expires": clock.monotonic() + self.ttl, "next": 0}
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+        if task.result() not in entry["rulings"]:
+            entry["rulings"].append(task.result())
+
+    async def get(self, key, fetch) -> Optional[str]:
+        """A ruling for `key`; fetch() returns the coroutine that asks the API, used only on a miss."""
+        self.lookups += 1
+        entry = self._entry(key)
+        if entry and len(entry["rulings"]) >= self.variants:
+            self.hits += 1
+            return self._rotate(entry)
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.shared += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(fetch())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+
+        # Shielded so one cancelled waiter doesn't cancel the request for the others
+        text = await asyncio.shield(task)
+        if text is None:
+            # The call failed or hit the daily limit; a cached ruling still beats the static text
+            entry = self._entry(key)
+            if entry:
+                return self._rotate(entry)
+        return text
+
+    def metrics(self) -> dict:
+        saved = self.hits + self.shared
+        return {
+            "keys": len(self._entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "shared_in_flight": self.shared,
+            "misses": self.misses,
+            "api_calls": self.calls,
+            "calls_saved": saved,
+            "hit_rate": round(saved / self.lookups, 4) if self.lookups else 0.0,
+        }
+
+
+ruling_cache = RulingCache(AI_CACHE_SIZE, AI_CACHE_TTL, AI_CACHE_VARIANTS)
+
+
+def normalize_reason(reason: str) -> str:
+    """Cache key form of an appeal reason: sanitized, lowercased, punctuation and extra spaces dropped."""
+    text = sanitize_for_prompt(reason, max_length=100, fallback="No reason given").lower()
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
 async def generate_appeal_response(granted: bool, reason: str) -> Optional[str]:
-    """Generate an AI judge ruling for a curfew appeal. Returns None on any failure."""
+    """AI judge ruling for a curfew appeal, reused from ruling_cache for repeated reasons.
+
+    Returns None on any failure.
+    """
+    if not ai_client:
+        return None
+    return await ruling_cache.get((granted, normalize_reason(reason)), lambda: request_appeal_ruling(granted, reason))
+
+
+async def request_appeal_ruling(granted: bool, reason: str) -> Optional[str]:
+    """Ask the AI for a judge ruling on a curfew appeal. Returns None on any failure."""
     global ai_call_count, ai_call_date
 
     if not ai_client:
         return None
 
-    today = datetime.now(PACIFIC_TZ).date()
+    cfg = get_settings()
+    today = utcnow().astimezone(DEFAULT_TZ).date()
     if ai_call_date != today:
         ai_call_count = 0
         ai_call_date = today
 
-    if ai_call_count >= AI_DAILY_LIMIT:
-        logger.info("AI daily limit reached, falling back to static appeal message")
+    if ai_call_count >= cfg['AI_DAILY_LIMIT']:
+        logger.info("AI daily limit reached, falling back to static appeal message", extra={"event": "appeal"})
         return None
 
     ai_call_count += 1
+    ruling_cache.calls += 1
 
     outcome = "GRANTED" if granted else "DENIED"
     safe_reason = sanitize_for_prompt(reason, max_length=100, fallback="No reason given")
@@ -791,7 +3156,7 @@ async def generate_appeal_response(granted: bool, reason: str) -> Optional[str]:
     try:
         response = await asyncio.wait_for(
             ai_client.messages.create(
-                model=AI_MODEL,
+                model=cfg['AI_MODEL'],
                 max_tokens=150,
                 system=APPEAL_SYSTEM_PROMPT,
                 messages=[{
@@ -802,7 +3167,7 @@ async def generate_appeal_response(granted: bool, reason: str) -> Optional[str]:
                     ),
                 }],
             ),
-            timeout=3.0,
+            timeout=cfg['AI_EDIT_DEADLINE'],
         )
         if not response.content:
             logger.warning("AI returned empty content for appeal")
@@ -811,39 +3176,68 @@ async def generate_appeal_response(granted: bool, reason: str) -> Optional[str]:
         return text if text else None
 
     except asyncio.TimeoutError:
-        logger.warning("AI appeal message timed out, falling back to static")
+        logger.warning("AI appeal message missed the edit deadline, keeping static text")
         return None
     except Exception as e:
-        logger.error(f"Error generating AI appeal message: {e}")
+        logger.error("Error generating AI appeal message: %s", e, extra={"event": "appeal"})
         return None
 
 
+_ai_edit_tasks = set()
+
+
+def upgrade_with_ai(message, embed: discord.Embed, make_text, prefix: str = ""):
+    """Edit AI text into an already-sent embed in the background.
+
+    make_text returns the generate_* coroutine. If it fails or misses
+    AI_EDIT_DEADLINE the static text simply stays.
+    """
+    if not ai_client or message is None:
+        return
+
+    async def run():
+        text = await make_text()
+        if not text:
+            return
+        embed.description = f"{prefix}{text}"
+        try:
+            await message.edit(embed=embed)
+        except discord.HTTPException as e:
+            logger.warning("Could not edit AI text into message: %s", e)
+
+    task = asyncio.create_task(run())
+    _ai_edit_tasks.add(task)
+    task.add_done_callback(_ai_edit_tasks.discard)
+
+
 async def send_shame_message(member, curfew_time: Optional[str] = None):
     """Send shame message when user violates curfew. Rate limited to once per 5 minutes per user."""
-    now = datetime.now(PACIFIC_TZ)
+    now = utcnow()
     last = last_shame_time.get(member.id)
     if last and (now - last).total_seconds() < 300:
         return
 
     try:
-        ai_text = await generate_shame_message(member.display_name, curfew_time)
-        if ai_text:
-            description = f"{member.mention} {ai_text}"
-        else:
-            description = f"{member.mention} tried to join voice chat during their curfew!"
-
-        general_channel = discord.utils.get(member.guild.channels, name="general")
+        started = time.monotonic()
+        general_channel = discord.utils.get(member.guild.channels, name=get_settings(member.guild.id)['SHAME_CHANNEL'])
         if general_channel:
+            # Post the static message right away; the AI version replaces it if it arrives in time
             embed = discord.Embed(
                 title="SHAME",
-                description=description,
+                description=f"{member.mention} tried to join voice chat during their curfew!",
                 color=discord.Color.red(),
             )
-            await general_channel.send(embed=embed)
+            message = await general_channel.send(embed=embed)
             last_shame_time[member.id] = now
+            record_event(member, "shame", (time.monotonic() - started) * 1000)
+            upgrade_with_ai(
+                message, embed,
+                lambda: generate_shame_message(member.display_name, curfew_time),
+                prefix=f"{member.mention} ",
+            )
 
     except Exception as e:
-        logger.error(f"Error sending shame message for {member.display_name}: {e}")
+        logger.error("Error sending shame message for %s: %s", member.display_name, e, extra=log_ctx(member, "shame"))
 
 # ---------------------------------------------------------------------------
 # Error handlers
@@ -852,20 +3246,24 @@ async def send_shame_message(member, curfew_time: Optional[str] = None):
 @bot.event
 async def on_error(event, *args, **kwargs):
     """Handle bot errors."""
-    logger.error(f"Bot error in {event}:\n{traceback.format_exc()}")
+    logger.error("Bot error in %s:\n%s", event, traceback.format_exc())
 
 
 @bot.event
 async def on_command_error(ctx, error):
     """Handle command errors."""
-    if isinstance(error, commands.MissingPermissions):
+    if not is_leader():
+        return
+    if isinstance(error, commands.HybridCommandError):
+        error = error.original
+    if isinstance(error, (commands.MissingPermissions, app_commands.MissingPermissions)):
         await ctx.send("You don't have permission to use this command.")
     elif isinstance(error, commands.MemberNotFound):
         await ctx.send("User not found. Please mention a valid user.")
     elif isinstance(error, commands.MissingRequiredArgument):
         await ctx.send("Missing required arguments. Use `!help` for command usage.")
     else:
-        logger.error(f"Command error: {error}")
+        logger.error("Command error: %s", error)
         await ctx.send("An error occurred while processing the command.")
 
 # ---------------------------------------------------------------------------
@@ -875,13 +3273,25 @@ async def on_command_error(ctx, error):
 async def shutdown():
     """Cleanly shut down the bot."""
     logger.info("Shutting down bot...")
-    for tasks in scheduled_tasks.values():
-        for task in tasks.values():
-            if task is not None:
-                task.cancel()
-    scheduled_tasks.clear()
+    cancel_all_tasks()
     appeal_state.clear()
 
+    if _lease_task:
+        _lease_task.cancel()
+        if is_leader():
+            release_lease(HA_INSTANCE_ID)
+
+    if _event_flush_task:
+        _event_flush_task.cancel()
+    remaining = drain_events()
+    if remaining and not insert_events(remaining):
+        logger.error("Lost %d buffered events at shutdown", len(remaining))
+
+    for task in list(_ai_edit_tasks):
+        task.cancel()
+
+    close_recorder()
+
     if _health_runner:
         await _health_runner.cleanup()
 
@@ -891,14 +3301,26 @@ async def shutdown():
 
 def handle_signal(sig):
     """Handle OS signals for graceful shutdown (Unix only)."""
-    logger.info(f"Received signal {sig.name}, initiating shutdown...")
+    logger.info("Received signal %s, initiating shutdown...", sig.name)
     asyncio.create_task(shutdown())
 
+
+def handle_reload():
+    """Reload settings on SIGHUP; invalid values are logged and the current settings kept."""
+    try:
+        reload_settings()
+    except ValueError as e:
+        logger.error("Settings reload rejected: %s", e, extra={"event": "config_reload"})
+
 # ---------------------------------------------------------------------------
 # Entry point
 # ---------------------------------------------------------------------------
 
 if __name__ == "__main__":
+    if not TOKEN:
+        logger.error("BOT_TOKEN is not set")
+        raise SystemExit(1)
+
     try:
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
@@ -912,12 +3334,17 @@ if __name__ == "__main__":
                 # Windows: add_signal_handler not supported, SIGTERM doesn't exist
                 # Ctrl+C is caught as KeyboardInterrupt instead
                 pass
+        try:
+            loop.add_signal_handler(signal.SIGHUP, handle_reload)
+        except (AttributeError, NotImplementedError, ValueError):
+            # Windows has no SIGHUP; reload with POST /api/config/reload instead
+            pass
 
         loop.run_until_complete(bot.start(TOKEN))
     except KeyboardInterrupt:
         logger.info("Keyboard interrupt received")
         loop.run_until_complete(shutdown())
     except Exception as e:
-        logger.error(f"Failed to start bot: {e}")
+        logger.error("Failed to start bot: %s", e)
     finally:
         loop.close()
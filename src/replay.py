@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+CurfewBot Replay Tool
+Feeds a gateway recording (RECORD_PATH) back through the bot's enforcement
+logic with Discord stubbed out, then reports enforcement latency percentiles.
+
+Usage:
+    python src/replay.py recording.ndjson [--speed 60] [--api-latency-ms 50]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import curfewbot
+
+
+class StubChannel:
+    """A text or voice channel that records nothing and answers after a fixed delay."""
+
+    def __init__(self, channel_id, name, api_latency):
+        self.id = channel_id
+        self.name = name
+        self.api_latency = api_latency
+
+    async def send(self, *args, **kwargs):
+        await asyncio.sleep(self.api_latency)
+        return SimpleNamespace(edit=self.send)
+
+
+class StubMember:
+    """Just enough of discord.Member for the enforcement paths."""
+
+    def __init__(self, user_id, name, guild):
+        self.id = user_id
+        self.display_name = name
+        self.mention = f"<@{user_id}>"
+        self.guild = guild
+        self.voice = None
+
+    async def move_to(self, channel):
+        await asyncio.sleep(self.guild.api_latency)
+        self.voice = SimpleNamespace(channel=channel) if channel else None
+
+
+class StubGuild:
+    """Guild whose members and voice channels are created on first sight in the recording."""
+
+    def __init__(self, guild_id, api_latency):
+        self.id = guild_id
+        self.name = "replay"
+        self.api_latency = api_latency
+        self.members = {}
+        self.voice_channels = {}
+        self.roles = []
+        self.channels = [
+            StubChannel(1, "general", api_latency),
+            StubChannel(2, "curfew", api_latency),
+        ]
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+    async def fetch_member(self, user_id):
+        await asyncio.sleep(self.api_latency)
+        return self.member(user_id, None)
+
+    def member(self, user_id, name):
+        if user_id not in self.members:
+            self.members[user_id] = StubMember(user_id, name or str(user_id), self)
+        return self.members[user_id]
+
+    def voice_channel(self, channel_id):
+        if channel_id is None:
+            return None
+        if channel_id not in self.voice_channels:
+            self.voice_channels[channel_id] = StubChannel(channel_id, f"voice-{channel_id}", self.api_latency)
+        return self.voice_channels[channel_id]
+
+
+async def _noop(*args, **kwargs):
+    return None
+
+
+def make_ctx(guild, author):
+    """A minimal commands.Context stand-in."""
+    return SimpleNamespace(
+        guild=guild,
+        author=author,
+        message=SimpleNamespace(attachments=[]),
+        send=guild.channels[0].send,
+        defer=_noop,
+    )
+
+
+async def dispatch(record, guild, samples):
+    """Feed one recorded event through the matching handler, timing it."""
+    kind = record.get("e")
+    started = time.monotonic()
+
+    if kind == "v":
+        member = guild.member(record["u"], record.get("n"))
+        before = SimpleNamespace(channel=guild.voice_channel(record.get("b")))
+        after = SimpleNamespace(channel=guild.voice_channel(record.get("a")))
+        member.voice = SimpleNamespace(channel=after.channel) if after.channel else None
+        await curfewbot.on_voice_state_update(member, before, after)
+    elif kind == "curfew":
+        admin = guild.member(record["u"], None)
+        target = guild.member(record["m"], record.get("n"))
+        await curfewbot.curfew.callback(make_ctx(guild, admin), record["time"], target)
+    elif kind == "appeal":
+        member = guild.member(record["u"], record.get("n"))
+        await curfewbot.appeal.callback(make_ctx(guild, member), reason=record.get("reason", ""))
+    else:
+        return
+
+    samples.setdefault(f"handler:{kind}", []).append((time.monotonic() - started) * 1000)
+
+
+async def replay(path, speed, api_latency, tail_hours):
+    """Replay a recording on a virtual clock set to the recorded timestamps, so curfews
+    set in the recording fire at their recorded times. speed paces events in real
+    time (0 runs them back to back)."""
+    guild = StubGuild(curfewbot.GUILD_ID, api_latency)
+    curfewbot.bot.get_guild = lambda guild_id: guild
+    curfewbot.init_database()
+
+    samples = {}
+    events = 0
+    first_ts = None
+    virtual = None
+    started = time.monotonic()
+
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if first_ts is None:
+                first_ts = record["t"]
+                virtual = curfewbot.VirtualClock(datetime.fromtimestamp(first_ts, timezone.utc))
+                curfewbot.clock = virtual
+            if speed > 0:
+                wait = (record["t"] - first_ts) / speed - (time.monotonic() - started)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            await virtual.advance_to(datetime.fromtimestamp(record["t"], timezone.utc))
+            await dispatch(record, guild, samples)
+            events += 1
+
+    # Run the virtual clock on so kicks and reminders scheduled near the end still fire
+    if virtual is not None:
+        await virtual.advance(tail_hours * 3600)
+    await asyncio.sleep(api_latency * 2)
+    curfewbot.cancel_all_tasks()
+
+    for _, _, event_type, _, latency_ms, _ in curfewbot.drain_events():
+        if latency_ms is not None:
+            samples.setdefault(f"enforce:{event_type}", []).append(latency_ms)
+
+    return events, time.monotonic() - started, samples
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def print_report(events, elapsed, samples):
+    print(f"Replayed {events} events in {elapsed:.1f}s")
+    print(f"{'kind':<24}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for kind in sorted(samples):
+        values = sorted(samples[kind])
+        print(
+            f"{kind:<24}{len(values):>8}"
+            f"{percentile(values, 0.50):>10.2f}{percentile(values, 0.90):>10.2f}"
+            f"{percentile(values, 0.99):>10.2f}{values[-1]:>10.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a CurfewBot gateway recording")
+    parser.add_argument("recording", help="NDJSON file written with RECORD_PATH")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Playback speed multiplier (0 = as fast as possible)")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0,
+                        help="Simulated Discord REST latency for stubbed calls")
+    parser.add_argument("--tail-hours", type=float, default=24.0,
+                        help="Virtual hours to run after the last event so pending kicks fire")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.recording):
+        print(f"Recording not found: {args.recording}")
+        return 1
+
+    # Isolated database, no AI calls, no HA lease, no re-recording
+    curfewbot.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="curfew-replay-"), "replay.db")
+    curfewbot.ai_client = None
+    curfewbot.HA_ENABLED = False
+    curfewbot.close_recorder()
+    curfewbot.logger.setLevel(logging.WARNING)
+
+    events, elapsed, samples = asyncio.run(
+        replay(args.recording, args.speed, args.api_latency_ms / 1000, args.tail_hours)
+    )
+    print_report(events, elapsed, samples)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+CurfewBot Simulation
+Runs days of curfews, reminders, appeals, rejoin attempts and midnight/DST
+crossings on a virtual clock in seconds, then reports scheduler overhead and
+any drift between when kicks fired and when they were due.
+
+Usage:
+    python src/simulate.py [--days 30] [--users 200] [--start 2026-10-20] [--seed 1]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from datetime import time as dt_time
+from types import SimpleNamespace
+
+import curfewbot
+from replay import StubGuild
+
+
+def capture_ctx(guild, author):
+    """Context stand-in whose send() returns immediately."""
+    async def send(*args, **kwargs):
+        return SimpleNamespace()
+    return SimpleNamespace(guild=guild, author=author, message=SimpleNamespace(attachments=[]),
+                           send=send, defer=send)
+
+
+def random_curfew_time(rng):
+    """A wall-clock curfew between 10:00 PM and 1:55 AM, so many cross midnight."""
+    minutes = (22 * 60 + rng.randrange(0, 48) * 5) % (24 * 60)
+    return dt_time(minutes // 60, minutes % 60)
+
+
+async def simulate(days, users, start_day, seed):
+    rng = random.Random(seed)
+    random.seed(seed)  # appeal rolls use the module-level RNG
+    tz = curfewbot.DEFAULT_TZ
+
+    virtual = curfewbot.VirtualClock(curfewbot.wall_to_utc(tz.key, start_day, dt_time(18, 0)))
+    curfewbot.clock = virtual
+
+    guild = StubGuild(curfewbot.GUILD_ID, 0)
+    curfewbot.bot.get_guild = lambda guild_id: guild
+    curfewbot.init_database()
+
+    admin = guild.member(1, "admin")
+    members = [guild.member(1000 + i, f"user{i}") for i in range(users)]
+    voice = guild.voice_channel(10)
+
+    counts = {"cycles": 0, "kick": 0, "reminder": 0, "shame": 0, "appeal_granted": 0, "appeal_denied": 0}
+    drift = []  # seconds between each kick and its independently computed due time
+    expected = {}
+    started = time.monotonic()
+
+    for day in range(days):
+        today = start_day + timedelta(days=day)
+        await virtual.advance_to(curfewbot.wall_to_utc(tz.key, today, dt_time(18, 0)))
+
+        actions = []
+        for member in members:
+            wall = random_curfew_time(rng)
+            member.voice = SimpleNamespace(channel=voice)
+            await curfewbot.curfew.callback(capture_ctx(guild, admin), wall.strftime('%I:%M%p'), member)
+            counts["cycles"] += 1
+
+            curfew_day = today if wall.hour >= 18 else today + timedelta(days=1)
+            due = curfewbot.wall_to_utc(tz.key, curfew_day, wall)
+            expected[member.id] = due
+
+            if rng.random() < 0.3:
+                actions.append((due - timedelta(minutes=rng.randint(1, 14)), "appeal", member))
+            if rng.random() < 0.2:
+                actions.append((due + timedelta(minutes=1), "rejoin", member))
+                actions.append((due + timedelta(minutes=3), "rejoin", member))
+
+        actions.sort(key=lambda action: (action[0], action[1], action[2].id))
+        for when, kind, member in actions:
+            await virtual.advance_to(when)
+            if kind == "appeal":
+                before = curfewbot.scheduled_due.get(member.id)
+                await curfewbot.appeal.callback(capture_ctx(guild, member), reason="one more game")
+                after = curfewbot.scheduled_due.get(member.id)
+                if after is not None and after != before:
+                    count = curfewbot.appeal_state[member.id]["count"]
+                    expected[member.id] += timedelta(minutes=curfewbot.get_settings(guild.id)['APPEAL_EXTENSIONS'][count - 1])
+            elif curfewbot.utcnow() >= expected[member.id]:
+                before_state = SimpleNamespace(channel=None)
+                member.voice = SimpleNamespace(channel=voice)
+                await curfewbot.on_voice_state_update(member, before_state, SimpleNamespace(channel=voice))
+
+        # Run the rest of the night; every pending kick and reminder fires on the way
+        await virtual.advance_to(curfewbot.wall_to_utc(tz.key, today + timedelta(days=1), dt_time(12, 0)))
+
+        # The first kick per user is the scheduled one; later kicks are rejoin enforcement
+        for user_id, _, event_type, created_at, _, _ in curfewbot.drain_events():
+            counts[event_type] = counts.get(event_type, 0) + 1
+            if event_type == "kick" and user_id in expected:
+                drift.append(created_at - expected.pop(user_id).timestamp())
+        expected.clear()
+
+    curfewbot.cancel_all_tasks()
+    return counts, drift, time.monotonic() - started
+
+
+def print_report(days, counts, drift, elapsed):
+    cycles = counts["cycles"]
+    print(f"Simulated {days} days / {cycles} curfew cycles in {elapsed:.2f}s real time")
+    print(f"Scheduler overhead: {elapsed / max(cycles, 1) * 1000:.3f} ms per curfew cycle")
+    for key in ("kick", "reminder", "shame", "appeal_granted", "appeal_denied"):
+        print(f"  {key:<16}{counts.get(key, 0):>8}")
+    drifted = [d for d in drift if abs(d) > 0.001]
+    worst = max((abs(d) for d in drift), default=0.0)
+    print(f"Kick drift: {len(drifted)} of {len(drift)} kicks off schedule, worst {worst:.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-accelerated CurfewBot simulation")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2026, 10, 20),
+                        help="First simulated day (default spans the November DST change)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # Isolated database, no AI calls, no HA lease, no recording
+    curfewbot.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="curfew-sim-"), "sim.db")
+    curfewbot.ai_client = None
+    curfewbot.HA_ENABLED = False
+    curfewbot.close_recorder()
+    curfewbot.logger.setLevel(logging.WARNING)
+
+    counts, drift, elapsed = asyncio.run(simulate(args.days, args.users, args.start, args.seed))
+    print_report(args.days, counts, drift, elapsed)
+    return 1 if any(abs(d) > 0.001 for d in drift) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())